@@ -1,44 +1,87 @@
-from flask import Flask, current_app, url_for
-from flask_login import LoginManager
-from flasgger import Swagger
-from flask_migrate import Migrate
+import time
+
+_import_started = time.perf_counter()
+
 from app.config import Config
+from app.startup import ImportTimer, StartupReport
+
+# With STARTUP_REPORT set, the imports below and those of create_app are timed one by one
+import_timer = ImportTimer()
+if Config.STARTUP_REPORT:
+    import_timer.start()
+
+import importlib
+from flask import Flask, Response, current_app, url_for
+from flask_login import LoginManager
 from app.models import User
 from app.database import db
-from app.auth import auth_bp
-from app.webhook import webhook_bp
-from app.pipedrive import pipedrive_bp
+from app.services.metrics import render_metrics
+from app.swagger import init_swagger
+from app.utils import logger, record_normalize_cache_metrics
+
+_import_seconds = time.perf_counter() - _import_started
+
+# Blueprint modules and their URL prefixes, imported by create_app
+BLUEPRINTS = (
+    ('app.auth', 'auth_bp', '/auth'),
+    ('app.webhook', 'webhook_bp', None),
+    ('app.pipedrive', 'pipedrive_bp', '/pipedrive'),
+)
 
 # Initialize Flask extensions
 login_manager = LoginManager()
-migrate = Migrate()
-swagger = Swagger()
 
 
 def create_app(config_class=Config):
     """
     Create and configure the Flask application.
+    Optional subsystems are set up only when enabled: Swagger with SWAGGER_ENABLED, the
+    Flask-Migrate `flask db` commands with MIGRATIONS_ENABLED and the saved companies with
+    WARM_ON_STARTUP. With STARTUP_REPORT set, the time spent in every initialization step and
+    the slowest imports are logged.
 
     :param config_class: Configuration class for the app. Default is Config.
     :return: Configured Flask app instance.
     """
+    report = StartupReport()
+    report.record('import app', _import_seconds)
+
     app = Flask(__name__)
     app.config.from_object(config_class)
 
     # Initialize extensions
-    db.init_app(app)
-    migrate.init_app(app, db)
-    login_manager.init_app(app)
-    swagger.init_app(app)
+    with report.step('init db'):
+        db.init_app(app)
+    # Flask-Migrate (and Alembic) only serve the `flask db` commands
+    if app.config['MIGRATIONS_ENABLED']:
+        with report.step('init migrate'):
+            from flask_migrate import Migrate
+            Migrate(app, db)
+    with report.step('init login'):
+        login_manager.init_app(app)
+    with report.step('init swagger'):
+        init_swagger(app)
 
     # Set LoginManager settings
     login_manager.login_view = 'auth_blueprint.login'
     login_manager.login_message = "Please log in to access this page."
 
     # Register blueprints
-    app.register_blueprint(auth_bp, url_prefix='/auth')
-    app.register_blueprint(webhook_bp)
-    app.register_blueprint(pipedrive_bp, url_prefix="/pipedrive")
+    for module_name, blueprint_name, url_prefix in BLUEPRINTS:
+        with report.step(f'import {module_name}'):
+            blueprint = getattr(importlib.import_module(module_name), blueprint_name)
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+
+    # Load the saved companies before the first request; otherwise they load on first use
+    if app.config['WARM_ON_STARTUP']:
+        with report.step('load saved companies'), app.app_context():
+            from app.services.saved_companies import saved_company_keys
+            saved_company_keys.warm()
+
+    # Register CLI commands
+    with report.step('import app.commands'):
+        from app.commands import register_commands
+        register_commands(app)
 
     # Define routes
     @app.route('/')
@@ -59,6 +102,20 @@ def create_app(config_class=Config):
               </p>
               """
 
+    @app.route('/metrics')
+    def metrics():
+        """
+        Prometheus metrics of all worker processes.
+        """
+        record_normalize_cache_metrics()
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
+
+    import_timer.stop()
+    report.imports = list(import_timer.timings)
+    app.extensions['startup_report'] = report
+    if app.config['STARTUP_REPORT']:
+        logger.info(report.summary())
     return app
 
 
@@ -1,7 +1,7 @@
 from flask import Blueprint, request
 from flask_login import login_user
 from app.models import User, Lead
-from flasgger import swag_from
+from app.swagger import swag_from
 from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.exceptions import BadRequest
 from app.swagger_docs import sign_up_docs, log_in_docs
@@ -31,14 +31,14 @@ def sign_up():
 
         response, status_code = User.create_user(email=email, password=password)
 
-        logger.info(f"User created successfully: {email}")
+        logger.info("User created successfully: %s", email)
         return create_response(data=response, status_code=status_code)
 
     except BadRequest as e:
-        logger.error(f"Bad request error: {e}")
+        logger.error("Bad request error: %s", e)
         return create_response(error={"message": str(e)}, status_code=400)
     except Exception as e:
-        logger.error(f"Error in sign-up: {e}")
+        logger.error("Error in sign-up: %s", e)
         return create_response(error={"message": "Internal server error", "details": str(e)}, status_code=500)
 
 
@@ -65,15 +65,15 @@ def login():
 
         if user:
             login_user(user)
-            logger.info(f"Login successful for user: {email}")
+            logger.info("Login successful for user: %s", email)
             return create_response(message="Login successful", status_code=200)
 
-        logger.warning(f"Failed login attempt for user: {email} (Invalid credentials)")
+        logger.warning("Failed login attempt for user: %s (Invalid credentials)", email)
         return create_response(error="Invalid email or password", status_code=401)
 
     except SQLAlchemyError as e:
-        logger.error(f"Database error during login: {e}")
+        logger.error("Database error during login: %s", e)
         return create_response(error={"message": "Database error", "details": str(e)}, status_code=500)
     except Exception as e:
-        logger.error(f"Unexpected error during login: {e}")
+        logger.error("Unexpected error during login: %s", e)
         return create_response(error={"message": "Something went wrong", "details": str(e)}, status_code=500)
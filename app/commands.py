@@ -0,0 +1,90 @@
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.services.backfill import backfill_hubspot_contacts, backfill_pipedrive_leads
+from app.services.google_sheets import get_google_sheet_snapshot
+from app.services.saved_companies import saved_company_keys
+from app.services.sheet_mirror import sync_sheet_rows
+from app.services.webhook_queue import run_webhook_workers
+
+
+@click.command('webhook-worker')
+@click.option('--threads', type=int, default=None, help='Number of worker threads (WEBHOOK_WORKER_THREADS).')
+@click.option('--batch-size', type=int, default=None, help='Events claimed per batch (WEBHOOK_WORKER_BATCH_SIZE).')
+@click.option('--poll-interval', type=float, default=None,
+              help='Seconds to wait when the queue is empty (WEBHOOK_WORKER_POLL_INTERVAL).')
+@with_appcontext
+def webhook_worker_command(threads, batch_size, poll_interval):
+    """Process queued HubSpot and Pipedrive webhook events."""
+    config = current_app.config
+    saved_company_keys.load()
+    run_webhook_workers(
+        current_app._get_current_object(),
+        threads=threads or config['WEBHOOK_WORKER_THREADS'],
+        batch_size=batch_size or config['WEBHOOK_WORKER_BATCH_SIZE'],
+        poll_interval=poll_interval or config['WEBHOOK_WORKER_POLL_INTERVAL'],
+    )
+
+
+@click.command('hubspot-backfill')
+@click.option('--batch-size', type=int, default=1000, show_default=True,
+              help='Contacts matched and checkpointed per batch.')
+@click.option('--concurrency', type=int, default=4, show_default=True,
+              help='Parallel company batch reads.')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches.')
+@click.option('--reset', is_flag=True, help='Ignore the saved checkpoint and start from the first contact.')
+@with_appcontext
+def hubspot_backfill_command(batch_size, concurrency, max_batches, reset):
+    """Match all existing HubSpot contacts against the sheet and save the leads."""
+    stats = backfill_hubspot_contacts(batch_size=batch_size, concurrency=concurrency,
+                                      max_batches=max_batches, reset=reset)
+    click.echo(f"HubSpot backfill finished: {stats}")
+
+
+@click.command('pipedrive-backfill')
+@click.option('--batch-size', type=int, default=500, show_default=True,
+              help='Organizations matched and checkpointed per batch.')
+@click.option('--concurrency', type=int, default=4, show_default=True,
+              help='Pipedrive accounts processed in parallel.')
+@click.option('--reset', is_flag=True, help='Ignore the saved checkpoints and start from the first lead.')
+@with_appcontext
+def pipedrive_backfill_command(batch_size, concurrency, reset):
+    """Match the existing leads of every connected Pipedrive account against the sheet."""
+    results = backfill_pipedrive_leads(batch_size=batch_size, concurrency=concurrency, reset=reset)
+    click.echo(f"Pipedrive backfill finished: {results}")
+
+
+@click.command('sync-sheet')
+@click.option('--interval', type=float, default=None,
+              help='Keep running and sync again every INTERVAL seconds.')
+@click.option('--force', is_flag=True, help='Compare every row even if the sheet revision was already synced.')
+@with_appcontext
+def sync_sheet_command(interval, force):
+    """Mirror the Google Sheet into the sheet_rows table used by SHEET_MATCH_BACKEND=database."""
+    while True:
+        snapshot, error = get_google_sheet_snapshot()
+        if not error:
+            stats, error = sync_sheet_rows(snapshot, force=force)
+        if error:
+            click.echo(f"Sheet sync failed: {error}", err=True)
+        else:
+            click.echo(f"Sheet sync finished: {stats}")
+        if not interval:
+            if error:
+                raise SystemExit(1)
+            return
+        force = False
+        time.sleep(interval)
+
+
+def register_commands(app):
+    """
+    Register the application's CLI commands.
+    """
+    app.cli.add_command(webhook_worker_command)
+    app.cli.add_command(hubspot_backfill_command)
+    app.cli.add_command(pipedrive_backfill_command)
+    app.cli.add_command(sync_sheet_command)
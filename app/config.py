@@ -12,12 +12,29 @@ class Config:
     GOOGLE_SHEETS_API_KEY = os.getenv('GOOGLE_SHEETS_API_KEY', 'your_default_google_sheets_api_key')
     SPREADSHEET_ID = os.getenv('SPREADSHEET_ID', 'your_default_spreadsheet_id')
     SPREADSHEET_SHEET_NAME = os.getenv('SPREADSHEET_SHEET_NAME', 'Sheet1')
+    GOOGLE_SHEETS_API_BASE_URL = os.getenv('GOOGLE_SHEETS_API_BASE_URL') or 'https://sheets.googleapis.com'
+    GOOGLE_DRIVE_API_BASE_URL = os.getenv('GOOGLE_DRIVE_API_BASE_URL') or 'https://www.googleapis.com'
+    SHEET_CACHE_TTL = float(os.getenv('SHEET_CACHE_TTL') or '60')
+    SHEET_CACHE_MAX_AGE = float(os.getenv('SHEET_CACHE_MAX_AGE') or '3600')
+    SHEET_SYNC_MODE = os.getenv('SHEET_SYNC_MODE') or 'incremental'
+    SHEET_FULL_RESYNC_INTERVAL = float(os.getenv('SHEET_FULL_RESYNC_INTERVAL') or '21600')
+    SHEET_EDIT_CHECK_INTERVAL = float(os.getenv('SHEET_EDIT_CHECK_INTERVAL') or '600')
+    DRIVE_CHANNEL_TOKEN = os.getenv('DRIVE_CHANNEL_TOKEN') or None
+    SHEET_SNAPSHOT_DIR = os.getenv('SHEET_SNAPSHOT_DIR') or None
+    NORMALIZE_CACHE_SIZE = int(os.getenv('NORMALIZE_CACHE_SIZE') or '65536')
+    COMPANY_MATCHER = os.getenv('COMPANY_MATCHER') or 'fuzzy'
+    COMPANY_MATCH_THRESHOLD = float(os.getenv('COMPANY_MATCH_THRESHOLD') or '0.5')
+    SHEET_MATCH_BACKEND = os.getenv('SHEET_MATCH_BACKEND') or 'memory'
+    SHEET_MATCH_SIMILARITY = float(os.getenv('SHEET_MATCH_SIMILARITY') or '0.3')
     SCOPE = os.getenv('SCOPE', 'oauth crm.objects.contacts.read')
     USER_ID = os.getenv('USER_ID')
     SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI', 'your-database-path')
     SQLALCHEMY_TRACK_MODIFICATIONS = os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS', 'False')
     HUBSPOT_BASE_URL = os.getenv('HUBSPOT_BASE_URL', 'https://app.hubspot.com/oauth')
     HUBSPOT_TOKEN_URL = os.getenv('HUBSPOT_TOKEN_URL', 'https://api.hubapi.com/oauth/v1/token')
+    HUBSPOT_API_BASE_URL = os.getenv('HUBSPOT_API_BASE_URL') or 'https://api.hubapi.com'
+    HUBSPOT_TOKEN_REFRESH_MARGIN = float(os.getenv('HUBSPOT_TOKEN_REFRESH_MARGIN') or '300')
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE') or '1024')
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key')
     BASE_URL = os.getenv('BASE_URL', 'localhost')
     PIPEDRIVE_CONSUMER_KEY = os.getenv('PIPEDRIVE_CONSUMER_KEY', '')
@@ -26,3 +43,35 @@ class Config:
     PIPEDRIVE_BASE_URL_V2 = os.getenv('PIPEDRIVE_BASE_URL_V2', 'https://api.pipedrive.com/v2/')
     PIPEDRIVE_ACCESS_TOKEN_URL = os.getenv('PIPEDRIVE_ACCESS_TOKEN_URL', 'https://oauth.pipedrive.com/oauth/token')
     PIPEDRIVE_AUTHORIZE_URL = os.getenv('PIPEDRIVE_AUTHORIZE_URL', 'https://oauth.pipedrive.com/oauth/authorize')
+    PIPEDRIVE_API_BASE_URL = os.getenv('PIPEDRIVE_API_BASE_URL') or 'https://api.pipedrive.com'
+    WEBHOOK_ASYNC = (os.getenv('WEBHOOK_ASYNC') or 'False').lower() == 'true'
+    SWAGGER_ENABLED = (os.getenv('SWAGGER_ENABLED') or 'True').lower() == 'true'
+    STARTUP_REPORT = (os.getenv('STARTUP_REPORT') or 'False').lower() == 'true'
+    MIGRATIONS_ENABLED = (os.getenv('MIGRATIONS_ENABLED') or 'True').lower() == 'true'
+    WARM_ON_STARTUP = (os.getenv('WARM_ON_STARTUP') or 'True').lower() == 'true'
+    WEBHOOK_WORKER_THREADS = int(os.getenv('WEBHOOK_WORKER_THREADS') or '4')
+    WEBHOOK_WORKER_BATCH_SIZE = int(os.getenv('WEBHOOK_WORKER_BATCH_SIZE') or '100')
+    WEBHOOK_WORKER_POLL_INTERVAL = float(os.getenv('WEBHOOK_WORKER_POLL_INTERVAL') or '1')
+    WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS') or '5')
+    WEBHOOK_VISIBILITY_TIMEOUT = float(os.getenv('WEBHOOK_VISIBILITY_TIMEOUT') or '300')
+    WEBHOOK_DEDUP_TTL = float(os.getenv('WEBHOOK_DEDUP_TTL') or '86400')
+    WEBHOOK_DEDUP_CACHE_SIZE = int(os.getenv('WEBHOOK_DEDUP_CACHE_SIZE') or '100000')
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS') or '4')
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE') or '16')
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT') or '3.05')
+    HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT') or '30')
+    HTTP_HOST_TIMEOUTS = os.getenv('HTTP_HOST_TIMEOUTS', '')
+    FANOUT_TIMEOUT = float(os.getenv('FANOUT_TIMEOUT') or '30')
+    FANOUT_MAX_WORKERS = int(os.getenv('FANOUT_MAX_WORKERS') or '16')
+    PIPEDRIVE_ORG_CACHE_SIZE = int(os.getenv('PIPEDRIVE_ORG_CACHE_SIZE') or '10000')
+    PIPEDRIVE_ORG_CACHE_TTL = float(os.getenv('PIPEDRIVE_ORG_CACHE_TTL') or '3600')
+    PIPEDRIVE_ORG_NEGATIVE_TTL = float(os.getenv('PIPEDRIVE_ORG_NEGATIVE_TTL') or '300')
+    HUBSPOT_CACHE_SIZE = int(os.getenv('HUBSPOT_CACHE_SIZE') or '50000')
+    HUBSPOT_CACHE_TTL = float(os.getenv('HUBSPOT_CACHE_TTL') or '3600')
+    CACHE_INVALIDATION_POLL_INTERVAL = float(os.getenv('CACHE_INVALIDATION_POLL_INTERVAL') or '1')
+    CACHE_INVALIDATION_RETENTION = float(os.getenv('CACHE_INVALIDATION_RETENTION') or '86400')
+    PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR') or None
+    LOG_LEVEL = os.getenv('LOG_LEVEL') or 'INFO'
+    LOG_FORMAT = os.getenv('LOG_FORMAT') or 'text'
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE') or '10000')
+    LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES') or 'Request successful for URL=100'
@@ -1,9 +1,36 @@
-from typing import Any, Dict
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 
+from cachetools import TLRUCache
 from flask_login import UserMixin
 from psycopg2 import IntegrityError
+from sqlalchemy.dialects import postgresql
 from werkzeug.security import generate_password_hash, check_password_hash
+from app.config import Config
 from app.database import db
+from app.services.cache import StatsCache
+
+
+class CachedToken:
+    """
+    Detached, read-only copy of a token row, safe to share between requests and threads.
+    """
+
+    def __init__(self, token: db.Model):
+        for column in token.__table__.columns:
+            setattr(self, column.name, getattr(token, column.name))
+
+    def __repr__(self):
+        return f'<CachedToken {self.id}>'
+
+
+# Process-local credential cache; entries expire at their token's expiration_time
+token_cache = StatsCache(TLRUCache(
+    maxsize=Config.TOKEN_CACHE_SIZE,
+    ttu=lambda _key, token, _now: token.expiration_time,
+    timer=time.time,
+), name='tokens')
 
 
 class User(db.Model, UserMixin):
@@ -60,6 +87,25 @@ class HubspotToken(db.Model):
         return f'<Hubspot Token {self.id}>'
 
 
+def company_key(company_name: str) -> Any:
+    """
+    Normalized company name used to detect duplicate leads, or None for an empty name.
+    """
+    from app.utils import normalize_name
+    return normalize_name(company_name or '') or None
+
+
+def dialect_insert(model):
+    """
+    INSERT construct of the session's database dialect, which supports ON CONFLICT clauses.
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(model)
+
+
 class Lead(db.Model):
     __tablename__ = 'leads'
 
@@ -70,6 +116,7 @@ class Lead(db.Model):
     lead_title = db.Column(db.String(255))
     company_name = db.Column(db.String(255))
     domain = db.Column(db.String(255), nullable=True)
+    company_key = db.Column(db.String(255), nullable=True, unique=True, index=True)
 
     def __repr__(self):
         return f'<Lead {self.lead_title}>'
@@ -83,7 +130,8 @@ class Lead(db.Model):
                 linkedin_url=linkedin_url,
                 lead_title=lead_title,
                 company_name=company_name,
-                domain=domain
+                domain=domain,
+                company_key=company_key(company_name)
             )
             db.session.add(new_lead)
             db.session.commit()
@@ -92,6 +140,55 @@ class Lead(db.Model):
             db.session.rollback()
             return None, str(e)
 
+    @classmethod
+    def upsert(cls, adviser_name, lead_name, linkedin_url, lead_title, company_name, domain=None):
+        """
+        Atomically insert a lead unless one with the same normalized company key exists
+        (INSERT ... ON CONFLICT DO NOTHING), so concurrent workers cannot create duplicates.
+        :return: A tuple of the new lead id (None if the company was already saved) and an error or None.
+        """
+        try:
+            statement = dialect_insert(cls).values(
+                adviser_name=adviser_name,
+                lead_name=lead_name,
+                linkedin_url=linkedin_url,
+                lead_title=lead_title,
+                company_name=company_name,
+                domain=domain,
+                company_key=company_key(company_name)
+            ).on_conflict_do_nothing(index_elements=['company_key']).returning(cls.id)
+            lead_id = db.session.execute(statement).scalar()
+            db.session.commit()
+            return lead_id, None
+        except Exception as e:
+            db.session.rollback()
+            return None, str(e)
+
+    @classmethod
+    def bulk_upsert(cls, leads: List[Dict[str, Any]]):
+        """
+        Insert many leads in one statement, skipping companies that are already saved.
+        :return: A tuple of the number of inserted leads and an error or None.
+        """
+        values = {}
+        for lead in leads:
+            key = company_key(lead['company_name'])
+            if key and key not in values:
+                values[key] = dict(lead, company_key=key)
+        if not values:
+            return 0, None
+        try:
+            statement = (
+                dialect_insert(cls).values(list(values.values()))
+                .on_conflict_do_nothing(index_elements=['company_key']).returning(cls.id)
+            )
+            inserted = len(db.session.execute(statement).all())
+            db.session.commit()
+            return inserted, None
+        except Exception as e:
+            db.session.rollback()
+            return 0, str(e)
+
 
 class AccessToken(db.Model):
     __tablename__ = 'access_tokens'
@@ -99,25 +196,59 @@ class AccessToken(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     access_token = db.Column(db.String(255), nullable=False)
     expiration_time = db.Column(db.Float, nullable=False)
+    refresh_token = db.Column(db.String(255), nullable=True)
+
+    CACHE_KEY = ('hubspot',)
 
-    def __init__(self, access_token, expiration_time):
+    def __init__(self, access_token, expiration_time, refresh_token=None):
         self.access_token = access_token
         self.expiration_time = expiration_time
+        self.refresh_token = refresh_token
 
     @staticmethod
     def get_token():
         return AccessToken.query.first()
 
     @staticmethod
-    def save_token(access_token, expiration_time):
+    def get_cached_token():
+        """
+        Return the token from the process-local cache, loading it from the database on a miss.
+        """
+        token = token_cache.get(AccessToken.CACHE_KEY)
+        if token is None:
+            db_token = AccessToken.get_token()
+            if not db_token:
+                return None
+            token = CachedToken(db_token)
+            token_cache.set(AccessToken.CACHE_KEY, token)
+        return token
+
+    @staticmethod
+    def invalidate_cache():
+        token_cache.pop(AccessToken.CACHE_KEY)
+
+    @staticmethod
+    def get_token_for_update():
+        """
+        Load the token row with a row lock held until the transaction ends, so only one
+        process at a time can refresh it. The locked row overwrites any instance already in the
+        session, so a refresh committed by another process is seen.
+        """
+        return AccessToken.query.populate_existing().with_for_update().first()
+
+    @staticmethod
+    def save_token(access_token, expiration_time, refresh_token=None):
         token = AccessToken.query.first()
         if token:
             token.access_token = access_token
             token.expiration_time = expiration_time
+            if refresh_token:
+                token.refresh_token = refresh_token
         else:
-            token = AccessToken(access_token, expiration_time)
+            token = AccessToken(access_token, expiration_time, refresh_token)
             db.session.add(token)
         db.session.commit()
+        AccessToken.invalidate_cache()
 
     @staticmethod
     def delete_token():
@@ -125,6 +256,7 @@ class AccessToken(db.Model):
         if token:
             db.session.delete(token)
             db.session.commit()
+        AccessToken.invalidate_cache()
 
     @staticmethod
     def delete_all_tokens():
@@ -132,6 +264,7 @@ class AccessToken(db.Model):
         if token:
             db.session.delete(token)
             db.session.commit()
+        AccessToken.invalidate_cache()
 
 
 class UserPipedriveToken(db.Model):
@@ -154,6 +287,7 @@ class UserPipedriveToken(db.Model):
     def save_token(user_email, access_token, expiration_time, creator_id=None):
         existing_token = UserPipedriveToken.query.filter_by(user_email=user_email).first()
         if existing_token:
+            UserPipedriveToken.invalidate_cache(existing_token.creator_id)
             existing_token.access_token = access_token
             existing_token.expiration_time = expiration_time
             existing_token.creator_id = creator_id  # Update the creator_id if available
@@ -166,7 +300,355 @@ class UserPipedriveToken(db.Model):
             )
             db.session.add(new_token)
         db.session.commit()
+        UserPipedriveToken.invalidate_cache(creator_id)
 
     @staticmethod
     def get_token_by_creator_id(creator_id):
         return UserPipedriveToken.query.filter_by(creator_id=creator_id).first()
+
+    @staticmethod
+    def get_cached_token_by_creator_id(creator_id):
+        """
+        Return the creator's token from the process-local cache, loading it from the database on a miss.
+        """
+        key = ('pipedrive', str(creator_id))
+        token = token_cache.get(key)
+        if token is None:
+            db_token = UserPipedriveToken.get_token_by_creator_id(creator_id)
+            if not db_token:
+                return None
+            token = CachedToken(db_token)
+            token_cache.set(key, token)
+        return token
+
+    @staticmethod
+    def invalidate_cache(creator_id):
+        if creator_id is not None:
+            token_cache.pop(('pipedrive', str(creator_id)))
+
+
+class WebhookEvent(db.Model):
+    """
+    Durable queue of raw webhook events, filled by the webhook endpoints and drained by the worker pool.
+    """
+    __tablename__ = 'webhook_events'
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(32), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_webhook_events_status_source_id', 'status', 'source', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<WebhookEvent {self.id} {self.source} {self.status}>'
+
+    @classmethod
+    def enqueue(cls, source: str, payloads: List[Dict]) -> List['WebhookEvent']:
+        events = [cls(source=source, payload=payload, status=cls.STATUS_PENDING, attempts=0) for payload in payloads]
+        db.session.add_all(events)
+        db.session.commit()
+        return events
+
+    @classmethod
+    def claim(cls, source: str, limit: int, stale_before: datetime, max_attempts: int) -> List['WebhookEvent']:
+        """
+        Lock up to ``limit`` pending events of a source and mark them as processing.
+        Rows locked by another worker are skipped (FOR UPDATE SKIP LOCKED); events stuck in
+        processing since before ``stale_before`` are picked up again, unless they have used up
+        their ``max_attempts``.
+        """
+        events = (
+            cls.query
+            .filter(cls.source == source)
+            .filter(db.or_(
+                cls.status == cls.STATUS_PENDING,
+                db.and_(cls.status == cls.STATUS_PROCESSING, cls.locked_at < stale_before,
+                        cls.attempts < max_attempts),
+            ))
+            .order_by(cls.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        now = datetime.utcnow()
+        for event in events:
+            event.status = cls.STATUS_PROCESSING
+            event.locked_at = now
+            event.attempts += 1
+        db.session.commit()
+        return events
+
+
+class WebhookDelivery(db.Model):
+    """
+    Delivery ids of received webhook events (HubSpot eventId, Pipedrive meta.id), so a delivery
+    retried by the sender is recognized. Rows live until expires_at; a done delivery keeps its
+    result to answer replays with.
+    """
+    __tablename__ = 'webhook_deliveries'
+
+    STATUS_PROCESSING = 'processing'
+    STATUS_QUEUED = 'queued'
+    STATUS_DONE = 'done'
+
+    source = db.Column(db.String(32), primary_key=True)
+    delivery_id = db.Column(db.String(64), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default=STATUS_PROCESSING)
+    webhook_event_id = db.Column(db.Integer, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    status_code = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<WebhookDelivery {self.source} {self.delivery_id} {self.status}>'
+
+    @classmethod
+    def claim(cls, source: str, delivery_ids: List[str], expires_at: datetime,
+              stale_before: datetime) -> Tuple[List[str], Dict[str, 'WebhookDelivery']]:
+        """
+        Atomically record the delivery ids that were not seen before (INSERT ... ON CONFLICT DO
+        NOTHING), so concurrent deliveries of the same event cannot both process it. Expired rows,
+        and claims left in processing since before ``stale_before``, no longer count.
+        :return: A tuple of the newly claimed ids and the existing rows of the other ids.
+        """
+        now = datetime.utcnow()
+        cls.query.filter(cls.source == source, cls.delivery_id.in_(delivery_ids)).filter(db.or_(
+            cls.expires_at < now,
+            db.and_(cls.status == cls.STATUS_PROCESSING, cls.created_at < stale_before),
+        )).delete(synchronize_session=False)
+        statement = dialect_insert(cls).values([
+            {"source": source, "delivery_id": delivery_id, "status": cls.STATUS_PROCESSING,
+             "created_at": now, "expires_at": expires_at}
+            for delivery_id in delivery_ids
+        ]).on_conflict_do_nothing(index_elements=['source', 'delivery_id']).returning(cls.delivery_id)
+        claimed = list(db.session.execute(statement).scalars())
+        db.session.commit()
+
+        others = [delivery_id for delivery_id in delivery_ids if delivery_id not in set(claimed)]
+        existing = {}
+        if others:
+            existing = {
+                delivery.delivery_id: delivery
+                for delivery in cls.query.filter(cls.source == source, cls.delivery_id.in_(others))
+            }
+        return claimed, existing
+
+    @classmethod
+    def mark_queued(cls, source: str, webhook_event_ids: Dict[str, int]) -> None:
+        for delivery_id, webhook_event_id in webhook_event_ids.items():
+            cls.query.filter_by(source=source, delivery_id=delivery_id).update(
+                {"status": cls.STATUS_QUEUED, "webhook_event_id": webhook_event_id})
+        db.session.commit()
+
+    @classmethod
+    def record(cls, source: str, results: Dict[str, Tuple[Dict, int]]) -> None:
+        for delivery_id, (result, status_code) in results.items():
+            cls.query.filter_by(source=source, delivery_id=delivery_id).update(
+                {"status": cls.STATUS_DONE, "result": result, "status_code": status_code})
+        db.session.commit()
+
+    @classmethod
+    def release(cls, source: str, delivery_ids: List[str]) -> None:
+        if delivery_ids:
+            cls.query.filter(cls.source == source, cls.delivery_id.in_(delivery_ids)).delete(
+                synchronize_session=False)
+            db.session.commit()
+
+    @classmethod
+    def purge_expired(cls) -> int:
+        deleted = cls.query.filter(cls.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+
+class SyncCheckpoint(db.Model):
+    """
+    Resume position of a long running sync or backfill job.
+    """
+    __tablename__ = 'sync_checkpoints'
+
+    name = db.Column(db.String(64), primary_key=True)
+    cursor = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SyncCheckpoint {self.name} {self.cursor}>'
+
+    @staticmethod
+    def get_cursor(name):
+        checkpoint = db.session.get(SyncCheckpoint, name)
+        return checkpoint.cursor if checkpoint else None
+
+    @staticmethod
+    def save_cursor(name, cursor):
+        checkpoint = db.session.get(SyncCheckpoint, name)
+        if checkpoint:
+            checkpoint.cursor = cursor
+        else:
+            db.session.add(SyncCheckpoint(name=name, cursor=cursor))
+        db.session.commit()
+
+    @staticmethod
+    def clear(name):
+        checkpoint = db.session.get(SyncCheckpoint, name)
+        if checkpoint:
+            db.session.delete(checkpoint)
+            db.session.commit()
+
+
+class CacheInvalidation(db.Model):
+    """
+    Cache entries invalidated in one worker process, for the processes of every host to drop from
+    their own caches (see app.services.cache_invalidation). Rows are kept for
+    CACHE_INVALIDATION_RETENTION seconds.
+    """
+    __tablename__ = 'cache_invalidations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    cache = db.Column(db.String(32), nullable=False)
+    object_id = db.Column(db.String(64), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    # Ids must never be reused, processes remember the last one they applied
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    def __repr__(self):
+        return f'<CacheInvalidation {self.id} {self.cache} {self.object_id}>'
+
+    @classmethod
+    def record(cls, cache: str, object_ids: List[Optional[str]]) -> List[Tuple[int, str, Optional[str], datetime]]:
+        """
+        :return: The (id, cache, object_id, created_at) tuples of the recorded entries.
+        """
+        entries = [cls(cache=cache, object_id=object_id, created_at=datetime.utcnow()) for object_id in object_ids]
+        db.session.add_all(entries)
+        db.session.flush()
+        recorded = [(entry.id, entry.cache, entry.object_id, entry.created_at) for entry in entries]
+        db.session.commit()
+        return recorded
+
+    @classmethod
+    def since(cls, last_id: int) -> List[Tuple[int, str, Optional[str], datetime]]:
+        return (
+            db.session.query(cls.id, cls.cache, cls.object_id, cls.created_at)
+            .filter(cls.id > last_id)
+            .order_by(cls.id)
+            .all()
+        )
+
+    @classmethod
+    def last_id(cls) -> int:
+        return db.session.query(db.func.max(cls.id)).scalar() or 0
+
+    @classmethod
+    def purge_before(cls, before: datetime) -> int:
+        deleted = cls.query.filter(cls.created_at < before).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+
+class SheetRow(db.Model):
+    """
+    Mirror of the Google Sheet rows with their precomputed company key and name tokens, kept up
+    to date by the sync-sheet command, so matching is an indexed query instead of a sheet download.
+    On Postgres, name_tokens has a GIN index (token matching with &&) and company_key a pg_trgm
+    GIN index (fuzzy matching with %); other databases store the tokens as JSON.
+    """
+    __tablename__ = 'sheet_rows'
+
+    row_number = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    adviser_name = db.Column(db.Text, nullable=True)
+    lead_name = db.Column(db.Text, nullable=True)
+    linkedin_url = db.Column(db.Text, nullable=True)
+    company_name = db.Column(db.Text, nullable=True)
+    lead_title = db.Column(db.Text, nullable=True)
+    company_key = db.Column(db.Text, nullable=True, index=True)
+    name_tokens = db.Column(postgresql.ARRAY(db.Text).with_variant(db.JSON(), 'sqlite'), nullable=False, default=list)
+    content_hash = db.Column(db.String(40), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_sheet_rows_name_tokens', 'name_tokens', postgresql_using='gin'),
+        db.Index('ix_sheet_rows_company_key_trgm', 'company_key', postgresql_using='gin',
+                 postgresql_ops={'company_key': 'gin_trgm_ops'}),
+    )
+
+    def __repr__(self):
+        return f'<SheetRow {self.row_number} {self.company_name}>'
+
+    def as_sheet_row(self) -> list:
+        """
+        The row in sheet column order (adviser, lead, LinkedIn URL, company, title).
+        """
+        return [self.adviser_name, self.lead_name, self.linkedin_url, self.company_name, self.lead_title]
+
+    @classmethod
+    def content_hashes(cls) -> Dict[int, str]:
+        return dict(db.session.query(cls.row_number, cls.content_hash).yield_per(10000))
+
+    @classmethod
+    def upsert_rows(cls, rows: List[Dict[str, Any]]) -> None:
+        """
+        Insert the rows, replacing the stored rows with the same row number.
+        """
+        if not rows:
+            return
+        statement = dialect_insert(cls).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=['row_number'],
+            set_={column: statement.excluded[column] for column in rows[0] if column != 'row_number'},
+        )
+        db.session.execute(statement)
+        db.session.commit()
+
+    @classmethod
+    def delete_from(cls, row_number: int) -> int:
+        """
+        Delete the rows from the given row number on, left over after the sheet shrank.
+        """
+        deleted = cls.query.filter(cls.row_number >= row_number).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    @classmethod
+    def _tokens_overlap(cls, tokens: List[str]):
+        if db.session.get_bind().dialect.name == 'postgresql':
+            return cls.name_tokens.overlap(tokens)
+        token = db.func.json_each(cls.name_tokens).table_valued('value')
+        return db.exists(db.select(1).select_from(token).where(token.c.value.in_(tokens)))
+
+    @classmethod
+    def find_first_by_tokens(cls, tokens: List[str]) -> Any:
+        """
+        The first row (in sheet order) whose name shares a token with the given ones, or None.
+        """
+        return cls.query.filter(cls._tokens_overlap(tokens)).order_by(cls.row_number).first()
+
+    @classmethod
+    def find_most_similar(cls, key: str, threshold: float) -> Any:
+        """
+        The row whose company key is the most trigram-similar to the given key, if at least
+        ``threshold`` similar; ties go to the earliest row. The % operator lets Postgres use the
+        trigram index, so thresholds below pg_trgm.similarity_threshold (0.3 by default) have no effect.
+        """
+        similarity = db.func.similarity(cls.company_key, key)
+        return (
+            cls.query
+            .filter(cls.company_key.op('%')(key), similarity >= threshold)
+            .order_by(similarity.desc(), cls.row_number)
+            .first()
+        )
@@ -1,26 +1,42 @@
 import json
 import os
+import threading
 import time
 from flask import request, session, url_for, redirect, Blueprint, jsonify, current_app
-from flask_oauthlib.client import OAuth, OAuthException
 import requests
-from app.models import UserPipedriveToken, Lead
-from app.services.google_sheets import get_google_sheet_data
-from app.services.pipedrive import manage_webhook, fetch_organization_data_with_token, fetch_creator_id_with_token
-from app.utils import logger, create_response, match_company_name
+from app.models import UserPipedriveToken
+from app.services.lead_matching import process_pipedrive_lead
+from app.services.pipedrive import manage_webhook, fetch_creator_id_with_token
+from app.services.webhook_dedup import (claim_deliveries, mark_deliveries_queued, pipedrive_delivery_id,
+                                        record_deliveries, release_deliveries)
+from app.services.webhook_queue import enqueue_webhook_events, SOURCE_PIPEDRIVE
+from app.utils import logger, create_response
 
 pipedrive_bp = Blueprint("pipedrive", __name__)
 
-oauth = OAuth()
-pipedrive = oauth.remote_app(
-    'pipedrive',
-    consumer_key=os.getenv("PIPEDRIVE_CONSUMER_KEY"),
-    consumer_secret=os.getenv("PIPEDRIVE_CONSUMER_SECRET"),
-    request_token_params={'scope': 'leads'},
-    base_url=os.getenv("PIPEDRIVE_BASE_URL_V1"),
-    access_token_url=os.getenv("PIPEDRIVE_ACCESS_TOKEN_URL"),
-    authorize_url=os.getenv("PIPEDRIVE_AUTHORIZE_URL"),
-)
+_pipedrive_oauth = None
+_pipedrive_oauth_lock = threading.Lock()
+
+
+def get_pipedrive_oauth():
+    """
+    The Pipedrive OAuth client, created on first use so flask_oauthlib is not imported at startup.
+    """
+    global _pipedrive_oauth
+    if _pipedrive_oauth is None:
+        with _pipedrive_oauth_lock:
+            if _pipedrive_oauth is None:
+                from flask_oauthlib.client import OAuth
+                _pipedrive_oauth = OAuth().remote_app(
+                    'pipedrive',
+                    consumer_key=os.getenv("PIPEDRIVE_CONSUMER_KEY"),
+                    consumer_secret=os.getenv("PIPEDRIVE_CONSUMER_SECRET"),
+                    request_token_params={'scope': 'leads'},
+                    base_url=os.getenv("PIPEDRIVE_BASE_URL_V1"),
+                    access_token_url=os.getenv("PIPEDRIVE_ACCESS_TOKEN_URL"),
+                    authorize_url=os.getenv("PIPEDRIVE_AUTHORIZE_URL"),
+                )
+    return _pipedrive_oauth
 
 
 @pipedrive_bp.route('/')
@@ -56,16 +72,18 @@ def authenticate():
         #   For testing, use ngrok link like this
         callback_url = os.getenv("PIPEDRIVE_CALLBACK_URL")
         # callback_url = url_for('pipedrive.authorized', _external=True, email=email)
-        logger.info(f"Redirecting to Pipedrive with callback URL: {callback_url}")
-        return pipedrive.authorize(callback=callback_url)
+        logger.info("Redirecting to Pipedrive with callback URL: %s", callback_url)
+        return get_pipedrive_oauth().authorize(callback=callback_url)
     except Exception as e:
-        logger.error(f"Error during authentication: {e}", exc_info=True)
+        logger.error("Error during authentication: %s", e, exc_info=True)
         return jsonify({"error": str(e)}), 500
 
 
 @pipedrive_bp.route('/auth/pipedrive/authorized')
 def authorized():
     """Handles the response from Pipedrive after authorization."""
+    pipedrive = get_pipedrive_oauth()
+    from flask_oauthlib.client import OAuthException
     try:
         email = request.args.get('email', None)
         response = pipedrive.authorized_response()
@@ -73,7 +91,7 @@ def authorized():
             error_message = (
                 "Invalid response from Pipedrive. Check redirect URI, scopes, or authorization status."
             )
-            logger.error(f"{error_message} Response: {response}")
+            logger.error("%s Response: %s", error_message, response)
             return jsonify({"error": error_message, "response": response}), 400
 
         access_token = response['access_token']
@@ -81,7 +99,7 @@ def authorized():
         logger.info("Access Token saved in session.")
 
         creator_id = fetch_creator_id_with_token(access_token)
-        logger.info(f"saving access token for email: {email}, and creator_id: {creator_id}")
+        logger.info("saving access token for email: %s, and creator_id: %s", email, creator_id)
         expiration_time = time.time() + 3600
         UserPipedriveToken.save_token(
             user_email=email,
@@ -102,11 +120,11 @@ def authorized():
         return redirect(url_for('pipedrive.home'))
 
     except OAuthException as e:
-        logger.error(f"OAuthException: {e}")
+        logger.error("OAuthException: %s", e)
         logger.error(e.data)
         return jsonify({"error": "OAuthException occurred", "details": e.data}), 500
     except Exception as e:
-        logger.error(f"Unexpected Exception: {e}", exc_info=True)
+        logger.error("Unexpected Exception: %s", e, exc_info=True)
         return jsonify({"error": "Unexpected error occurred", "details": str(e)}), 500
 
 
@@ -120,57 +138,41 @@ def process_new_lead_webhook():
             logger.warning("No creator_id found in the webhook data.")
             return jsonify({"error": "No creator_id found"}), 400
 
-        user_token = UserPipedriveToken.get_token_by_creator_id(creator_id)
-
-        if not user_token:
-            logger.warning(f"No access token found for creator_id {creator_id}")
-            return jsonify({"error": f"No access token for creator_id {creator_id}"}), 404
-
-        access_token = user_token.access_token
-        organization_id = data['data'].get('organization_id')
-        organization_data = fetch_organization_data_with_token(organization_id, access_token)
-        if 'error' in organization_data:
-            # print(organization_data)
-            error_details = organization_data.get('details', {})
-            logger.error(f"Failed to fetch organization data")
-            logger.error(error_details)
-            return create_response(
-                message="Failed to fetch organization data",
-                data=error_details,
-                status_code=401,
-            )
-        company_name = organization_data['data']['name']
-
-        # return organization_data
-        sheet_data, error = get_google_sheet_data()
-        # sheet_data = get_google_sheet_data()
-        if error:
-            logger.error(f"Failed to fetch data from Google Sheets: {error}")
-            return create_response(message="Failed to fetch data from Google Sheets", data={"details": error},
-                                   status_code=500)
-
-        # Compare with Google Sheets and save lead if matched
-        for row in sheet_data:
-            company_name_in_sheet = row[3].lower() if row[3] else ""
-            if match_company_name(name_in_hubspot=company_name, name_in_sheet=company_name_in_sheet):
-                # if company_name == company_name_in_sheet:
-                if Lead.query.filter_by(company_name=company_name).first():
-                    logger.info(f"Skipping: Company '{company_name}' already exists in the database.")
-                    return create_response(message=f"Skipping: Company '{company_name}' already exists in the database."
-                                           ,status_code=200)
-                else:
-                    Lead.create_and_save(
-                        adviser_name=row[0],
-                        lead_name=row[1],
-                        linkedin_url=row[2],
-                        lead_title=row[4],
-                        company_name=row[3],
-                        # domain=domain
-                    )
-                    logger.info(f"Lead for '{row[3]}' has been saved to the database.")
-                    return create_response(message=f"Lead for '{company_name}' has been saved to the database.",
-                                           status_code=200)
+        # Pipedrive retries deliveries it considers timed out; a replay gets the recorded response
+        delivery_id = pipedrive_delivery_id(data)
+        if delivery_id is not None:
+            claimed, replays = claim_deliveries(SOURCE_PIPEDRIVE, [delivery_id])
+            if delivery_id not in claimed:
+                recorded = replays.get(delivery_id)
+                if recorded is None:
+                    return create_response(message="Lead already received and being processed.", status_code=202)
+                return create_response(message=recorded["result"]["message"],
+                                       data=recorded["result"].get("details"), status_code=recorded["status_code"])
+
+        if current_app.config['WEBHOOK_ASYNC']:
+            try:
+                event_ids = enqueue_webhook_events(SOURCE_PIPEDRIVE, [data])
+            except Exception:
+                if delivery_id is not None:
+                    release_deliveries(SOURCE_PIPEDRIVE, [delivery_id])
+                raise
+            if delivery_id is not None:
+                mark_deliveries_queued(SOURCE_PIPEDRIVE, {delivery_id: event_ids[0]})
+            return create_response(message="Lead queued for processing.", data={"event_ids": event_ids},
+                                   status_code=202)
+
+        try:
+            result, status_code = process_pipedrive_lead(data)
+        except Exception:
+            if delivery_id is not None:
+                release_deliveries(SOURCE_PIPEDRIVE, [delivery_id])
+            raise
+        if delivery_id is not None:
+            record_deliveries(SOURCE_PIPEDRIVE, {delivery_id: (result, status_code)})
+        if status_code in (400, 404):
+            return jsonify({"error": result["message"]}), status_code
+        return create_response(message=result["message"], data=result.get("details"), status_code=status_code)
 
     except Exception as e:
-        logger.error(f"Error processing webhook: {e}", exc_info=True)
+        logger.error("Error processing webhook: %s", e, exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,230 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, current_app
+
+from app.database import db
+from app.models import CachedToken, Lead, SyncCheckpoint, UserPipedriveToken, company_key
+from app.services.company_matcher import find_matching_row
+from app.services.google_sheets import get_google_sheet_snapshot
+from app.services.hubspot import HUBSPOT_BATCH_LIMIT, batch_read_companies, list_contact_companies_page
+from app.services.lead_matching import lead_values_from_row
+from app.services.metrics import LEAD_SAVE_DURATION
+from app.services.pipedrive import fetch_organizations_by_ids, list_leads_page, website_domain
+from app.services.saved_companies import saved_company_keys
+from app.services.sheet_cache import SheetSnapshot
+from app.utils import logger
+
+HUBSPOT_BACKFILL_CHECKPOINT = 'hubspot_contacts_backfill'
+PIPEDRIVE_BACKFILL_CHECKPOINT = 'pipedrive_leads_backfill:{creator_id}'
+PIPEDRIVE_ORGANIZATIONS_LIMIT = 100
+
+
+def _run_with_app_context(app: Flask, function, *args):
+    with app.app_context():
+        try:
+            return function(*args)
+        finally:
+            db.session.remove()
+
+
+def match_companies(companies: Dict[str, Dict], snapshot: SheetSnapshot) -> List[Dict]:
+    """
+    Match CRM companies (id -> properties with name and domain) against one sheet snapshot.
+    :return: Lead column values for every matched company.
+    """
+    leads = []
+    for properties in companies.values():
+        company_name = (properties.get("name") or "").lower()
+        row = find_matching_row(company_name, snapshot) if company_name else None
+        if row:
+            leads.append(lead_values_from_row(row, properties.get("domain")))
+    return leads
+
+
+def save_leads(leads: List[Dict]) -> Tuple[int, Optional[str]]:
+    """
+    Bulk-insert the leads whose companies are not saved yet. Companies this process knows as
+    saved are confirmed with one query for the whole batch.
+    :return: A tuple of the number of inserted leads and an error or None.
+    """
+    keys = [company_key(lead["company_name"]) for lead in leads]
+    saved = saved_company_keys.confirmed(sorted({key for key in keys if saved_company_keys.contains(key)}))
+    new_leads = [lead for lead, key in zip(leads, keys) if key not in saved]
+    if not new_leads:
+        return 0, None
+    with LEAD_SAVE_DURATION.labels('bulk_upsert').time():
+        inserted, error = Lead.bulk_upsert(new_leads)
+    if not error:
+        saved_company_keys.add(keys)
+    return inserted, error
+
+
+def _collect_contact_batch(after: Optional[str], batch_size: int) -> Dict:
+    """
+    Read contact pages (100 per call) until batch_size contacts are collected or paging ends.
+    """
+    batch = {"contact_companies": {}, "contacts": 0, "pages": 0, "after": after}
+    while batch["contacts"] < batch_size:
+        page, error = list_contact_companies_page(after=batch["after"])
+        if error:
+            raise RuntimeError(f"Failed to list HubSpot contacts: {error}")
+        batch["contact_companies"].update(page["contact_companies"])
+        batch["contacts"] += page["contacts"]
+        batch["pages"] += 1
+        batch["after"] = page["after"]
+        if not page["after"]:
+            break
+    return batch
+
+
+def backfill_hubspot_contacts(batch_size: int = 1000, concurrency: int = 4,
+                              max_batches: Optional[int] = None, reset: bool = False) -> Dict[str, int]:
+    """
+    Pages through all HubSpot contacts and their company associations, matches the companies
+    against a single sheet snapshot and bulk-inserts the matched leads.
+    Contacts are processed in batches of ``batch_size``; the companies of a batch are read with
+    ``concurrency`` parallel batch calls. The paging cursor is checkpointed after every batch, so
+    an interrupted run resumes where it stopped.
+    :return: Counters describing the run.
+    """
+    if reset:
+        SyncCheckpoint.clear(HUBSPOT_BACKFILL_CHECKPOINT)
+    snapshot, error = get_google_sheet_snapshot()
+    if error:
+        raise RuntimeError(f"Failed to fetch data from Google Sheets: {error}")
+
+    app = current_app._get_current_object()
+    stats = {"batches": 0, "pages": 0, "contacts": 0, "companies": 0, "matched": 0, "inserted": 0}
+    after = SyncCheckpoint.get_cursor(HUBSPOT_BACKFILL_CHECKPOINT)
+    if after:
+        logger.info("Resuming HubSpot backfill after cursor %s", after)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while max_batches is None or stats["batches"] < max_batches:
+            batch = _collect_contact_batch(after, batch_size)
+
+            company_ids = sorted(set(batch["contact_companies"].values()))
+            chunks = [company_ids[start:start + HUBSPOT_BATCH_LIMIT]
+                      for start in range(0, len(company_ids), HUBSPOT_BATCH_LIMIT)]
+            companies = {}
+            for chunk_companies, error in executor.map(
+                    lambda chunk: _run_with_app_context(app, batch_read_companies, chunk), chunks):
+                if error:
+                    raise RuntimeError(f"Failed to read HubSpot companies: {error}")
+                companies.update(chunk_companies)
+
+            leads = match_companies(companies, snapshot)
+            inserted, error = save_leads(leads)
+            if error:
+                raise RuntimeError(f"Failed to save leads: {error}")
+
+            stats["batches"] += 1
+            stats["pages"] += batch["pages"]
+            stats["contacts"] += batch["contacts"]
+            stats["companies"] += len(companies)
+            stats["matched"] += len(leads)
+            stats["inserted"] += inserted
+            after = batch["after"]
+            logger.info("HubSpot backfill progress: %s", stats)
+            if not after:
+                SyncCheckpoint.clear(HUBSPOT_BACKFILL_CHECKPOINT)
+                break
+            SyncCheckpoint.save_cursor(HUBSPOT_BACKFILL_CHECKPOINT, after)
+    return stats
+
+
+def _backfill_pipedrive_creator(token: CachedToken, snapshot: SheetSnapshot, batch_size: int,
+                                reset: bool) -> Dict[str, int]:
+    """
+    Backfill the leads of one Pipedrive account. Organization ids are de-duplicated across all
+    leads of the run, so each organization is fetched at most once.
+    """
+    checkpoint = PIPEDRIVE_BACKFILL_CHECKPOINT.format(creator_id=token.creator_id)
+    if reset:
+        SyncCheckpoint.clear(checkpoint)
+    start = int(SyncCheckpoint.get_cursor(checkpoint) or 0)
+    stats = {"leads": 0, "organizations": 0, "matched": 0, "inserted": 0, "expired": 0}
+    seen_organization_ids = set()
+
+    while True:
+        # Never use a token past its expiry; the checkpoint lets a later run continue
+        if token.expiration_time <= time.time():
+            logger.warning("Pipedrive token of creator_id %s expired, stopping at %s", token.creator_id, start)
+            stats["expired"] = 1
+            return stats
+
+        organization_ids = []
+        next_start = start
+        while next_start is not None and len(organization_ids) < batch_size:
+            page = list_leads_page(token.access_token, start=next_start)
+            if 'error' in page:
+                raise RuntimeError(f"Failed to list leads of creator_id {token.creator_id}: {page['details']}")
+            for lead in page["leads"]:
+                organization_id = lead.get("organization_id")
+                if organization_id and organization_id not in seen_organization_ids:
+                    seen_organization_ids.add(organization_id)
+                    organization_ids.append(organization_id)
+            stats["leads"] += len(page["leads"])
+            next_start = page["next_start"]
+
+        organizations = {}
+        for offset in range(0, len(organization_ids), PIPEDRIVE_ORGANIZATIONS_LIMIT):
+            chunk = organization_ids[offset:offset + PIPEDRIVE_ORGANIZATIONS_LIMIT]
+            result = fetch_organizations_by_ids(chunk, token.access_token)
+            if 'error' in result:
+                raise RuntimeError(f"Failed to fetch organizations of creator_id {token.creator_id}: "
+                                   f"{result['details']}")
+            for organization_id, organization in result["organizations"].items():
+                organizations[organization_id] = {"name": organization.get("name"),
+                                                  "domain": website_domain(organization.get("website"))}
+
+        leads = match_companies(organizations, snapshot)
+        inserted, error = save_leads(leads)
+        if error:
+            raise RuntimeError(f"Failed to save leads: {error}")
+        stats["organizations"] += len(organizations)
+        stats["matched"] += len(leads)
+        stats["inserted"] += inserted
+
+        if next_start is None:
+            SyncCheckpoint.clear(checkpoint)
+            return stats
+        start = next_start
+        SyncCheckpoint.save_cursor(checkpoint, str(start))
+
+
+def backfill_pipedrive_leads(batch_size: int = 500, concurrency: int = 4, reset: bool = False) -> Dict[str, Dict]:
+    """
+    Backfills the leads of every connected Pipedrive account, running up to ``concurrency``
+    accounts in parallel. Accounts whose token has expired are skipped.
+    :return: Counters per creator_id.
+    """
+    snapshot, error = get_google_sheet_snapshot()
+    if error:
+        raise RuntimeError(f"Failed to fetch data from Google Sheets: {error}")
+
+    now = time.time()
+    tokens = [CachedToken(token) for token in UserPipedriveToken.query.all()]
+    active_tokens = [token for token in tokens if token.expiration_time > now]
+    for token in tokens:
+        if token.expiration_time <= now:
+            logger.warning("Skipping creator_id %s: Pipedrive token expired", token.creator_id)
+
+    app = current_app._get_current_object()
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            token.creator_id: executor.submit(
+                _run_with_app_context, app, _backfill_pipedrive_creator, token, snapshot, batch_size, reset)
+            for token in active_tokens
+        }
+        for creator_id, future in futures.items():
+            try:
+                results[creator_id] = future.result()
+            except Exception as e:
+                logger.error("Pipedrive backfill failed for creator_id %s: %s", creator_id, e)
+                results[creator_id] = {"error": str(e)}
+            logger.info("Pipedrive backfill of creator_id %s: %s", creator_id, results[creator_id])
+    return results
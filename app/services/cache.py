@@ -0,0 +1,58 @@
+import threading
+from typing import Any, Dict, Hashable, Optional
+
+from cachetools import Cache
+
+from app.services.metrics import CACHE_LOOKUPS
+
+
+class StatsCache:
+    """
+    Thread-safe wrapper around a cachetools cache that counts hits and misses.
+    The eviction policy (LRU, TTL, per-item expiry) is the one of the wrapped cache.
+    Named caches also report their lookups to the cache_lookups_total metric.
+    """
+
+    def __init__(self, cache: Cache, name: Optional[str] = None):
+        self._cache = cache
+        self._lock = threading.Lock()
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self._cache[key]
+                hit = True
+                self.hits += 1
+            except KeyError:
+                value = default
+                hit = False
+                self.misses += 1
+        if self.name:
+            CACHE_LOOKUPS.labels(self.name, 'hit' if hit else 'miss').inc()
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._cache[key] = value
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+            }
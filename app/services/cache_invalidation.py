@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config import Config
+from app.database import db
+from app.models import CacheInvalidation
+from app.utils import logger
+
+# (id, object id, created_at) of an invalidation, as handed to the handlers
+InvalidationEntry = Tuple[int, Optional[str], datetime]
+
+
+class CacheInvalidations:
+    """
+    Invalidations of process-local caches, broadcast to the worker processes of every host
+    through the cache_invalidations table.
+
+    publish() applies an invalidation in the calling process right away and records it.
+    Every process applies the entries recorded since its last poll, at most once every
+    ``poll_interval`` seconds, from poll(); caches call it before they are read. Entries older
+    than ``retention`` seconds are deleted, so ``retention`` must be at least the TTL of the
+    caches, whose entries expire on their own by then.
+    """
+
+    def __init__(self, poll_interval: float = 1, retention: float = 86400):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._handlers: Dict[str, Callable[[List[InvalidationEntry]], None]] = {}
+        self._last_id: Optional[int] = None
+        self._polled_at = 0.0
+        self._lock = threading.Lock()
+
+    def subscribe(self, cache: str, handler: Callable[[List[InvalidationEntry]], None]) -> None:
+        """
+        Register the handler dropping the entries invalidated in ``cache``.
+        """
+        self._handlers[cache] = handler
+
+    def publish(self, cache: str, object_ids: Iterable[Optional[str]]) -> None:
+        object_ids = [None if object_id is None else str(object_id) for object_id in object_ids]
+        if not object_ids:
+            return
+        try:
+            recorded = CacheInvalidation.record(cache, object_ids)
+            CacheInvalidation.purge_before(datetime.utcnow() - timedelta(seconds=self.retention))
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error broadcasting %s invalidations: %s", cache, e)
+            # Still drop the entries of this process; the others serve them until they expire
+            recorded = [(0, cache, object_id, datetime.utcnow()) for object_id in object_ids]
+        self._apply(recorded)
+
+    def poll(self) -> None:
+        """
+        Apply the invalidations recorded by other processes since the last poll. The first poll
+        of a process only notes where the table stands, its caches are still empty.
+        """
+        now = time.monotonic()
+        if now - self._polled_at < self.poll_interval or not self._lock.acquire(blocking=False):
+            return
+        try:
+            if now - self._polled_at < self.poll_interval:
+                return
+            self._polled_at = now
+            if self._last_id is None:
+                self._last_id = CacheInvalidation.last_id()
+            else:
+                entries = CacheInvalidation.since(self._last_id)
+                if entries:
+                    self._last_id = entries[-1][0]
+                    self._apply(entries)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("Error polling cache invalidations: %s", e)
+        finally:
+            self._lock.release()
+
+    def _apply(self, entries: List[Tuple[int, str, Optional[str], datetime]]) -> None:
+        by_cache = defaultdict(list)
+        for entry_id, cache, object_id, created_at in entries:
+            by_cache[cache].append((entry_id, object_id, created_at))
+        for cache, cache_entries in by_cache.items():
+            handler = self._handlers.get(cache)
+            if handler:
+                handler(cache_entries)
+
+
+cache_invalidations = CacheInvalidations(
+    poll_interval=Config.CACHE_INVALIDATION_POLL_INTERVAL,
+    retention=Config.CACHE_INVALIDATION_RETENTION,
+)
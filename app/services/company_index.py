@@ -0,0 +1,65 @@
+from typing import Dict, List, Optional
+
+from app.services.metrics import COMPANY_MATCH_ROWS_SCANNED
+from app.services.sheet_cache import SheetSnapshot
+from app.utils import normalize_name
+
+COMPANY_NAME_COLUMN = 3
+
+
+class CompanyIndex:
+    """
+    Inverted index over the normalized company names of the sheet rows.
+
+    Answers the same question as ``match_company_name`` for every row at once: the first row
+    (in sheet order) whose normalized name shares its first token with the CRM name, or
+    contains any of the CRM name's tokens.
+    """
+
+    def __init__(self, rows: list):
+        self.token_rows: Dict[str, List[int]] = {}
+        self.first_token_rows: Dict[str, List[int]] = {}
+        for row_id, row in enumerate(rows):
+            name = row[COMPANY_NAME_COLUMN] if len(row) > COMPANY_NAME_COLUMN and row[COMPANY_NAME_COLUMN] else ""
+            tokens = normalize_name(name).split()
+            if not tokens:
+                continue
+            self.first_token_rows.setdefault(tokens[0], []).append(row_id)
+            for token in set(tokens):
+                self.token_rows.setdefault(token, []).append(row_id)
+
+    def find_first_match(self, company_name: str) -> Optional[int]:
+        """
+        Return the id of the first row matching the given company name, or None.
+        Posting lists are built in row order, so their first entry is the earliest row.
+        """
+        tokens = normalize_name(company_name).split()
+        if not tokens:
+            return None
+
+        candidates = []
+        first_token_rows = self.first_token_rows.get(tokens[0])
+        if first_token_rows:
+            candidates.append(first_token_rows[0])
+        for token in tokens:
+            token_rows = self.token_rows.get(token)
+            if token_rows:
+                candidates.append(token_rows[0])
+        COMPANY_MATCH_ROWS_SCANNED.labels('token').observe(len(candidates))
+        return min(candidates) if candidates else None
+
+
+def get_company_index(snapshot: SheetSnapshot) -> CompanyIndex:
+    """
+    Return the company index of a sheet snapshot, building it on first use.
+    """
+    return snapshot.derived('company_index', CompanyIndex)
+
+
+def find_first_matching_row(company_name: str, snapshot: SheetSnapshot) -> Optional[list]:
+    """
+    Find the first sheet row whose company name matches the given CRM company name.
+    :return: The matching sheet row or None.
+    """
+    row_id = get_company_index(snapshot).find_first_match(company_name)
+    return snapshot.rows[row_id] if row_id is not None else None
@@ -0,0 +1,138 @@
+import math
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+
+from app.services.company_index import COMPANY_NAME_COLUMN, find_first_matching_row
+from app.services.metrics import COMPANY_MATCH_DURATION, COMPANY_MATCH_ROWS_SCANNED
+from app.services.sheet_cache import SheetSnapshot
+from app.services.sheet_mirror import find_mirrored_row
+from app.utils import normalize_name
+
+
+def company_name_features(name: str) -> List[int]:
+    """
+    Hashed features of a company name: its normalized tokens and the character trigrams of the
+    normalized name. crc32 keeps the hashes stable across processes.
+    """
+    normalized = normalize_name(name)
+    if not normalized:
+        return []
+    features = {f"w:{token}" for token in normalized.split()}
+    padded = f"  {normalized} "
+    features.update(f"t:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return sorted({zlib.crc32(feature.encode('utf-8')) for feature in features})
+
+
+class FuzzyCompanyMatcher:
+    """
+    Scores a company name against every sheet row in one vectorized pass.
+
+    Rows are stored as an inverted index in CSR form: for each feature hash (sorted), the rows
+    containing it. Feature weights are IDF values computed over the snapshot, and the score is
+    the cosine similarity of the IDF-weighted feature sets. A query only touches the postings of
+    its own features, and np.bincount accumulates them into per-row scores.
+    """
+
+    def __init__(self, features: np.ndarray, offsets: np.ndarray, postings: np.ndarray,
+                 idf: np.ndarray, row_norms: np.ndarray):
+        self.features = features
+        self.offsets = offsets
+        self.postings = postings
+        self.idf = idf
+        self.row_norms = row_norms
+
+    @classmethod
+    def from_rows(cls, rows: list) -> 'FuzzyCompanyMatcher':
+        row_features = []
+        for row in rows:
+            name = row[COMPANY_NAME_COLUMN] if len(row) > COMPANY_NAME_COLUMN and row[COMPANY_NAME_COLUMN] else ""
+            row_features.append(company_name_features(name))
+
+        counts = np.fromiter((len(features) for features in row_features), dtype=np.int64, count=len(rows))
+        all_features = np.fromiter((feature for features in row_features for feature in features),
+                                   dtype=np.uint32, count=int(counts.sum()))
+        all_rows = np.repeat(np.arange(len(rows), dtype=np.int32), counts)
+
+        # Group the (feature, row) pairs by feature; a stable sort keeps rows ascending
+        order = np.argsort(all_features, kind='stable')
+        sorted_features = all_features[order]
+        postings = all_rows[order]
+        features, first_index, document_frequency = np.unique(sorted_features, return_index=True,
+                                                               return_counts=True)
+        offsets = np.append(first_index, len(sorted_features)).astype(np.int64)
+
+        idf = (np.log((len(rows) + 1) / (document_frequency + 1)) + 1).astype(np.float32)
+        squared_weights = np.repeat(idf.astype(np.float64) ** 2, document_frequency)
+        row_norms = np.sqrt(np.bincount(postings, weights=squared_weights, minlength=len(rows)))
+        return cls(features, offsets, postings, idf, row_norms.astype(np.float32))
+
+    def score(self, company_name: str) -> Optional[np.ndarray]:
+        """
+        Cosine similarity of the company name with every row, or None if the name has no features.
+        """
+        query = np.asarray(company_name_features(company_name), dtype=np.uint32)
+        if not len(query):
+            return None
+        if not len(self.features):
+            return np.zeros(len(self.row_norms), dtype=np.float32)
+
+        positions = np.minimum(np.searchsorted(self.features, query), len(self.features) - 1)
+        known = self.features[positions] == query
+        # Features that appear in no row weigh as much as the rarest known feature
+        query_weights = np.where(known, self.idf[positions], self.idf.max()).astype(np.float64)
+        query_norm = math.sqrt(float(np.sum(query_weights ** 2)))
+        positions = positions[known]
+
+        starts, lengths = self.offsets[positions], self.offsets[positions + 1] - self.offsets[positions]
+        # Concatenate the postings of the matched features without a Python loop
+        posting_index = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        COMPANY_MATCH_ROWS_SCANNED.labels('fuzzy').observe(len(posting_index))
+        weights = np.repeat(self.idf[positions].astype(np.float64) ** 2, lengths)
+        dot = np.bincount(self.postings[posting_index], weights=weights, minlength=len(self.row_norms))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = dot / (self.row_norms * query_norm)
+        return np.nan_to_num(scores, nan=0.0, posinf=0.0).astype(np.float32)
+
+    def best_match(self, company_name: str, threshold: float) -> Tuple[Optional[int], float]:
+        """
+        Return the best scoring row id and its score, or (None, score) below the threshold.
+        Ties go to the earliest row.
+        """
+        scores = self.score(company_name)
+        if scores is None or not len(scores):
+            return None, 0.0
+        row_id = int(np.argmax(scores))
+        score = float(scores[row_id])
+        return (row_id, score) if score >= threshold else (None, score)
+
+
+def get_fuzzy_matcher(snapshot: SheetSnapshot) -> FuzzyCompanyMatcher:
+    """
+    Return the fuzzy matcher of a sheet snapshot, building it on first use.
+    """
+    return snapshot.derived('fuzzy_matcher', FuzzyCompanyMatcher.from_rows)
+
+
+def find_matching_row(company_name: str, snapshot: Optional[SheetSnapshot]) -> Optional[list]:
+    """
+    Find the sheet row matching the given CRM company name with the configured matcher:
+    "fuzzy" (best IDF-weighted score above COMPANY_MATCH_THRESHOLD) or "token" (first row
+    sharing a token, the original behaviour). Without a snapshot (SHEET_MATCH_BACKEND=database)
+    the sheet_rows table is queried instead.
+    :return: The matching sheet row or None.
+    """
+    matcher = 'token' if current_app.config['COMPANY_MATCHER'] == 'token' else 'fuzzy'
+    if snapshot is None:
+        return find_mirrored_row(company_name, matcher)
+    started = time.perf_counter()
+    if matcher == 'token':
+        row = find_first_matching_row(company_name, snapshot)
+    else:
+        row_id, _ = get_fuzzy_matcher(snapshot).best_match(company_name, current_app.config['COMPANY_MATCH_THRESHOLD'])
+        row = snapshot.rows[row_id] if row_id is not None else None
+    COMPANY_MATCH_DURATION.labels(matcher).observe(time.perf_counter() - started)
+    return row
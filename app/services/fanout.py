@@ -0,0 +1,87 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Flask, current_app
+
+from app.config import Config
+from app.utils import logger
+
+FANOUT_MAX_WORKERS = Config.FANOUT_MAX_WORKERS
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix='fanout')
+    return _executor
+
+
+def _forget_executor_after_fork() -> None:
+    # Threads do not survive fork; forked workers start their own pool on first use
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_executor_after_fork)
+
+
+def _call_in_app_context(app: Flask, call: Callable[[], Tuple[Any, Optional[str]]]) -> Tuple[Any, Optional[str]]:
+    with app.app_context():
+        return call()
+
+
+class FanOutError(str):
+    """
+    Error message of a failed fan-out, naming the calls that failed or missed the deadline.
+    """
+
+    def __new__(cls, message: str, calls: Tuple[str, ...]):
+        error = super().__new__(cls, message)
+        error.calls = calls
+        return error
+
+
+def fan_out(calls: Dict[str, Callable[[], Tuple[Any, Optional[str]]]],
+            timeout: float) -> Tuple[Optional[Dict[str, Any]], Optional[FanOutError]]:
+    """
+    Runs independent upstream calls concurrently under one shared deadline.
+
+    Every call returns a (value, error) tuple, like the rest of the service layer. As soon as one
+    call fails, raises or the deadline passes, the calls that have not started yet are cancelled
+    and the error is returned; results of calls already running are discarded.
+    :return: A tuple of a name -> value mapping or None and an error message or None. The error
+        is a FanOutError whose ``calls`` name the failed call, or every call still pending at
+        the deadline.
+    """
+    app = current_app._get_current_object()
+    executor = _get_executor()
+    futures = {executor.submit(_call_in_app_context, app, call): name for name, call in calls.items()}
+    values = {}
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            name = futures[future]
+            try:
+                value, error = future.result()
+            except Exception as e:
+                logger.error("Fan-out call '%s' raised: %s", name, e, exc_info=True)
+                error = f"Error: {str(e)}"
+            if error:
+                return None, FanOutError(error, (name,))
+            values[name] = value
+    except FuturesTimeoutError:
+        pending = tuple(sorted(name for future, name in futures.items() if not future.done()))
+        logger.error("Fan-out deadline of %ss exceeded waiting for %s", timeout, pending)
+        return None, FanOutError(f"Timed out after {timeout}s waiting for {', '.join(pending)}", pending)
+    finally:
+        for future in futures:
+            future.cancel()
+    return values, None
@@ -1,24 +1,59 @@
-from typing import Tuple, Optional
-import requests
+import hmac
+from typing import Dict, Mapping, Tuple, Optional
+from flask import current_app
+from app.config import Config
+from app.services import http_client
+from app.services.cache_invalidation import cache_invalidations
+from app.services.metrics import WEBHOOK_EVENTS
+from app.services.shared_snapshot import SharedSheetCache
+from app.services.sheet_cache import SheetCache, SheetGeneration, SheetSnapshot
+from app.services.sheet_sync import row_hashes, sheet_sync
 from app.utils import logger
-import os
 
+GOOGLE_SHEETS_API_BASE_URL = Config.GOOGLE_SHEETS_API_BASE_URL
+GOOGLE_DRIVE_API_BASE_URL = Config.GOOGLE_DRIVE_API_BASE_URL
+# "incremental" syncs columns A-E with range requests, "full" downloads the whole sheet every time
+SHEET_SYNC_MODE = Config.SHEET_SYNC_MODE
 
-def get_google_sheet_data() -> Tuple[Optional[list], Optional[str]]:
+# Bumped by Drive change notifications; every worker of every host checks it before serving its snapshot
+sheet_generation = SheetGeneration(cache_invalidations)
+
+# With SHEET_SNAPSHOT_DIR set, the workers of a host share one memory-mapped snapshot file
+SHEET_SNAPSHOT_DIR = Config.SHEET_SNAPSHOT_DIR
+if SHEET_SNAPSHOT_DIR:
+    sheet_cache = SharedSheetCache(
+        SHEET_SNAPSHOT_DIR,
+        ttl=Config.SHEET_CACHE_TTL,
+        max_age=Config.SHEET_CACHE_MAX_AGE,
+        generation=sheet_generation,
+        sync=sheet_sync,
+    )
+else:
+    sheet_cache = SheetCache(
+        ttl=Config.SHEET_CACHE_TTL,
+        max_age=Config.SHEET_CACHE_MAX_AGE,
+        generation=sheet_generation,
+    )
+
+
+def _get_sheet_settings() -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    config = current_app.config
+    return config.get('GOOGLE_SHEETS_API_KEY'), config.get('SPREADSHEET_ID'), config.get('SPREADSHEET_SHEET_NAME')
+
+
+def fetch_google_sheet_values() -> Tuple[Optional[list], Optional[str]]:
     """
-    Retrieves data from a specified Google Sheet.
+    Downloads all rows of the configured Google Sheet, bypassing the cache.
     :return: A tuple containing the sheet data as a list or None and an error message or None.
     """
     try:
-        google_sheets_api_key = os.getenv('GOOGLE_SHEETS_API_KEY')
-        spreadsheet_id = os.getenv('SPREADSHEET_ID')
-        spreadsheet_sheet_name = os.getenv('SPREADSHEET_SHEET_NAME')
+        google_sheets_api_key, spreadsheet_id, spreadsheet_sheet_name = _get_sheet_settings()
         if not google_sheets_api_key or not spreadsheet_id or not spreadsheet_sheet_name:
             error_message = "Missing required environment variables."
             logger.error(error_message)
             return None, error_message
-        url = f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}/values/{spreadsheet_sheet_name}?key={google_sheets_api_key}"
-        response = requests.get(url)
+        url = f"{GOOGLE_SHEETS_API_BASE_URL}/v4/spreadsheets/{spreadsheet_id}/values/{spreadsheet_sheet_name}?key={google_sheets_api_key}"
+        response = http_client.get(url)
         if response.status_code != 200:
             error_message = f"Failed to retrieve data. Status code: {response.status_code}, Message: {response.text}"
             logger.error(error_message)
@@ -27,5 +62,105 @@ def get_google_sheet_data() -> Tuple[Optional[list], Optional[str]]:
         logger.info("Successfully retrieved data from Google Sheet.")
         return response_data.get("values", []), None
     except Exception as e:
-        logger.error(f"Error in get_google_sheet_data: {e}")
+        logger.error("Error in fetch_google_sheet_values: %s", e)
         return None, f"Error: {str(e)}"
+
+
+def fetch_google_sheet_rows(previous: Optional[SheetSnapshot] = None) -> Tuple[Optional[list], Optional[str]]:
+    """
+    Retrieves the rows of a new sheet snapshot: everything in "full" sync mode, or only what
+    changed since the previous snapshot in "incremental" mode.
+    :return: A tuple containing the rows as a list or None and an error message or None.
+    """
+    if SHEET_SYNC_MODE != 'incremental':
+        return fetch_google_sheet_values()
+    try:
+        google_sheets_api_key, spreadsheet_id, spreadsheet_sheet_name = _get_sheet_settings()
+        if not google_sheets_api_key or not spreadsheet_id or not spreadsheet_sheet_name:
+            error_message = "Missing required environment variables."
+            logger.error(error_message)
+            return None, error_message
+        settings = (GOOGLE_SHEETS_API_BASE_URL, google_sheets_api_key, spreadsheet_id, spreadsheet_sheet_name)
+        if previous is None:
+            return sheet_sync.sync(settings, None)
+        return sheet_sync.sync(settings, previous.rows, previous.derived('row_hashes', row_hashes))
+    except Exception as e:
+        logger.error("Error in fetch_google_sheet_rows: %s", e)
+        return None, f"Error: {str(e)}"
+
+
+def fetch_google_sheet_revision() -> Optional[str]:
+    """
+    Looks up the spreadsheet's Drive file version, which changes whenever the sheet is edited.
+    This is a small metadata request used to avoid downloading unchanged sheet data.
+    :return: The revision identifier, or None if it could not be determined.
+    """
+    try:
+        google_sheets_api_key, spreadsheet_id, _ = _get_sheet_settings()
+        if not google_sheets_api_key or not spreadsheet_id:
+            return None
+        url = f"{GOOGLE_DRIVE_API_BASE_URL}/drive/v3/files/{spreadsheet_id}"
+        params = {"fields": "version,modifiedTime", "key": google_sheets_api_key}
+        response = http_client.get(url, params=params)
+        if response.status_code != 200:
+            logger.warning("Failed to retrieve sheet revision. Status code: %s", response.status_code)
+            return None
+        response_data = response.json()
+        return response_data.get("version") or response_data.get("modifiedTime")
+    except Exception as e:
+        logger.warning("Error in fetch_google_sheet_revision: %s", e)
+        return None
+
+
+def get_google_sheet_snapshot() -> Tuple[Optional[SheetSnapshot], Optional[str]]:
+    """
+    Returns the cached snapshot of the Google Sheet, refreshing it when stale.
+    :return: A tuple containing the snapshot or None and an error message or None.
+    """
+    return sheet_cache.get(fetch_google_sheet_rows, fetch_google_sheet_revision)
+
+
+def get_google_sheet_data() -> Tuple[Optional[list], Optional[str]]:
+    """
+    Retrieves data from a specified Google Sheet.
+    :return: A tuple containing the sheet data as a list or None and an error message or None.
+    """
+    snapshot, error = get_google_sheet_snapshot()
+    if error:
+        return None, error
+    return snapshot.rows, None
+
+
+def invalidate_google_sheet_cache() -> None:
+    """
+    Forces the next read to download the Google Sheet again.
+    """
+    sheet_cache.invalidate()
+
+
+def process_drive_notification(headers: Mapping[str, str]) -> Tuple[Dict, int]:
+    """
+    Handles a Google Drive push notification (files.watch channel) for the spreadsheet: content
+    changes bump the shared sheet generation, so every worker refreshes its snapshot on next use.
+    :return: A tuple of the result (outcome and message) and the HTTP status code matching it.
+    """
+    channel_token = current_app.config['DRIVE_CHANNEL_TOKEN']
+    if not channel_token or not hmac.compare_digest(headers.get('X-Goog-Channel-Token', ''), channel_token):
+        logger.warning("Rejected Drive notification for channel %s: invalid token.", headers.get('X-Goog-Channel-ID'))
+        return {"outcome": "error", "message": "Invalid channel token"}, 403
+
+    resource_state = headers.get('X-Goog-Resource-State', '')
+    _, spreadsheet_id, _ = _get_sheet_settings()
+    if resource_state == 'sync':
+        # Sent once when the channel is created
+        outcome, message = "ignored", "Channel sync acknowledged"
+    elif not spreadsheet_id or spreadsheet_id not in headers.get('X-Goog-Resource-URI', ''):
+        outcome, message = "ignored", "Notification is not about the configured spreadsheet"
+    elif resource_state == 'update' and 'content' not in headers.get('X-Goog-Changed', 'content'):
+        outcome, message = "ignored", "Spreadsheet content unchanged"
+    else:
+        sheet_generation.bump()
+        logger.info("Drive reported a %s of the spreadsheet, sheet snapshots invalidated.", resource_state)
+        outcome, message = "invalidated", "Sheet snapshot invalidated"
+    WEBHOOK_EVENTS.labels('google_drive', outcome).inc()
+    return {"outcome": outcome, "message": message}, 200
@@ -0,0 +1,170 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from cachetools import TTLCache
+
+from app.config import Config
+from app.services.cache import StatsCache
+from app.services.cache_invalidation import InvalidationEntry, cache_invalidations
+from app.utils import HUBSPOT_API_BASE_URL, logger, get_hubspot_auth_headers, make_hubspot_api_request
+
+# HubSpot batch endpoints accept at most 100 inputs per call
+HUBSPOT_BATCH_LIMIT = 100
+COMPANY_PROPERTIES = ["name", "domain"]
+
+# contact id -> company id, and company id -> {"name", "domain"}; entries are dropped early
+# when HubSpot reports a change through the webhook (see invalidate_companies / invalidate_contacts),
+# in every worker process through the cache invalidations table
+contact_company_cache = StatsCache(TTLCache(
+    maxsize=Config.HUBSPOT_CACHE_SIZE,
+    ttl=Config.HUBSPOT_CACHE_TTL,
+), name='hubspot_contact_companies')
+company_cache = StatsCache(TTLCache(
+    maxsize=Config.HUBSPOT_CACHE_SIZE,
+    ttl=Config.HUBSPOT_CACHE_TTL,
+), name='hubspot_companies')
+
+
+def _chunks(items: List[str], size: int = HUBSPOT_BATCH_LIMIT):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def batch_read_contact_companies(contact_ids: List[str]) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+    """
+    Resolves the primary associated company of each contact with the v4 associations batch endpoint.
+    :return: A tuple of a contact id -> company id mapping or None and an error message or None.
+    """
+    cache_invalidations.poll()
+    contact_companies = {}
+    missing_contact_ids = []
+    for contact_id in contact_ids:
+        company_id = contact_company_cache.get(str(contact_id))
+        if company_id is None:
+            missing_contact_ids.append(contact_id)
+        else:
+            contact_companies[str(contact_id)] = company_id
+    if not missing_contact_ids:
+        return contact_companies, None
+
+    url = f"{HUBSPOT_API_BASE_URL}/crm/v4/associations/contacts/companies/batch/read"
+    headers = get_hubspot_auth_headers()
+    for chunk in _chunks(missing_contact_ids):
+        payload = {"inputs": [{"id": str(contact_id)} for contact_id in chunk]}
+        response_data, error = make_hubspot_api_request(url, headers, method="POST", json=payload)
+        if error:
+            logger.error("Error retrieving contact company associations: %s", error)
+            return None, error
+        for result in response_data.get("results", []):
+            associations = result.get("to") or []
+            if associations:
+                contact_id, company_id = str(result["from"]["id"]), str(associations[0]["toObjectId"])
+                contact_companies[contact_id] = company_id
+                contact_company_cache.set(contact_id, company_id)
+    return contact_companies, None
+
+
+def batch_read_companies(company_ids: List[str],
+                         properties: List[str] = COMPANY_PROPERTIES) -> Tuple[Optional[Dict[str, Dict]], Optional[str]]:
+    """
+    Fetches the given properties of several companies with the v3 companies batch endpoint.
+    Only the requested properties are transferred; the default ones are served from the cache.
+    :return: A tuple of a company id -> properties mapping or None and an error message or None.
+    """
+    use_cache = properties == COMPANY_PROPERTIES
+    if use_cache:
+        cache_invalidations.poll()
+    companies = {}
+    missing_company_ids = []
+    for company_id in company_ids:
+        cached = company_cache.get(str(company_id)) if use_cache else None
+        if cached is None:
+            missing_company_ids.append(company_id)
+        else:
+            companies[str(company_id)] = cached
+    if not missing_company_ids:
+        return companies, None
+
+    url = f"{HUBSPOT_API_BASE_URL}/crm/v3/objects/companies/batch/read"
+    headers = get_hubspot_auth_headers()
+    for chunk in _chunks(missing_company_ids):
+        payload = {"properties": properties, "inputs": [{"id": str(company_id)} for company_id in chunk]}
+        response_data, error = make_hubspot_api_request(url, headers, method="POST", json=payload)
+        if error:
+            logger.error("Error retrieving companies: %s", error)
+            return None, error
+        for result in response_data.get("results", []):
+            company = {name: (result.get("properties") or {}).get(name) for name in properties}
+            companies[str(result["id"])] = company
+            if use_cache:
+                company_cache.set(str(result["id"]), company)
+    return companies, None
+
+
+def list_contact_companies_page(after: Optional[str] = None,
+                                limit: int = HUBSPOT_BATCH_LIMIT) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Fetches one page of contacts together with their company associations.
+    :return: A tuple of {"contact_companies": {contact id: company id}, "contacts": count,
+        "after": next cursor or None} or None and an error message or None.
+    """
+    url = f"{HUBSPOT_API_BASE_URL}/crm/v3/objects/contacts"
+    params = {"limit": limit, "associations": "companies", "archived": "false"}
+    if after:
+        params["after"] = after
+    response_data, error = make_hubspot_api_request(url, get_hubspot_auth_headers(), params=params)
+    if error:
+        logger.error("Error listing contacts: %s", error)
+        return None, error
+    contact_companies = {}
+    results = response_data.get("results", [])
+    for contact in results:
+        companies = (contact.get("associations") or {}).get("companies", {}).get("results") or []
+        if companies:
+            contact_companies[str(contact["id"])] = str(companies[0]["id"])
+    next_page = (response_data.get("paging") or {}).get("next") or {}
+    return {"contact_companies": contact_companies, "contacts": len(results), "after": next_page.get("after")}, None
+
+
+def get_contacts_company_details(contact_ids: List[str]) -> Tuple[Optional[Dict[str, Dict]], Optional[str]]:
+    """
+    Batch equivalent of get_hubspot_company_details: two API calls per 100 contacts.
+    :return: A tuple of a contact id -> company properties mapping or None and an error message or None.
+        Contacts without an associated company are left out of the mapping.
+    """
+    contact_companies, error = batch_read_contact_companies(contact_ids)
+    if error:
+        return None, error
+    if not contact_companies:
+        return {}, None
+
+    companies, error = batch_read_companies(sorted(set(contact_companies.values())))
+    if error:
+        return None, error
+    return {
+        contact_id: companies[company_id]
+        for contact_id, company_id in contact_companies.items()
+        if company_id in companies
+    }, None
+
+
+def _drop_entries(cache: StatsCache) -> Callable[[List[InvalidationEntry]], None]:
+    def drop(entries: List[InvalidationEntry]) -> None:
+        for _entry_id, object_id, _created_at in entries:
+            cache.pop(object_id)
+    return drop
+
+
+cache_invalidations.subscribe(company_cache.name, _drop_entries(company_cache))
+cache_invalidations.subscribe(contact_company_cache.name, _drop_entries(contact_company_cache))
+
+
+def invalidate_companies(company_ids: Iterable[str]) -> None:
+    cache_invalidations.publish(company_cache.name, company_ids)
+
+
+def invalidate_contacts(contact_ids: Iterable[str]) -> None:
+    cache_invalidations.publish(contact_company_cache.name, contact_ids)
+
+
+def hubspot_cache_stats() -> Dict[str, Dict]:
+    return {"contact_companies": contact_company_cache.stats(), "companies": company_cache.stats()}
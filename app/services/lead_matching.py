@@ -0,0 +1,238 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from app.models import Lead, UserPipedriveToken, company_key
+from app.services.company_matcher import find_matching_row
+from app.services.fanout import FanOutError, fan_out
+from app.services.google_sheets import get_google_sheet_snapshot
+from app.services.metrics import LEAD_SAVE_DURATION, WEBHOOK_EVENTS
+from app.services.hubspot import get_contacts_company_details, invalidate_companies, invalidate_contacts
+from app.services.pipedrive import fetch_organization_summary
+from app.services.saved_companies import saved_company_keys
+from app.services.sheet_cache import SheetSnapshot
+from app.utils import logger, record_normalize_cache_metrics
+
+# Outcomes reported for every processed event
+OUTCOME_SAVED = "saved"
+OUTCOME_SKIPPED = "skipped"
+OUTCOME_NO_MATCH = "no_match"
+OUTCOME_NO_COMPANY = "no_company"
+OUTCOME_ERROR = "error"
+OUTCOME_INVALIDATED = "invalidated"
+OUTCOME_IGNORED = "ignored"
+OUTCOME_IN_PROGRESS = "in_progress"
+
+# HubSpot webhook subscriptions that invalidate cached companies or contact associations
+COMPANY_CHANGE_EVENTS = {"company.propertyChange", "company.deletion", "company.merge", "company.restore"}
+ASSOCIATION_CHANGE_EVENTS = {"contact.associationChange", "company.associationChange", "contact.deletion",
+                             "contact.merge"}
+# What each fanned-out call fetches, for error messages
+FETCH_DESCRIPTIONS = {
+    "organization": "organization data",
+    "companies": "company details",
+    "sheet": "data from Google Sheets",
+}
+
+
+def lead_values_from_row(row: list, domain: Optional[str] = None) -> Dict[str, Optional[str]]:
+    """
+    Map a matched sheet row to Lead column values.
+    """
+    return {
+        "adviser_name": row[0],
+        "lead_name": row[1],
+        "linkedin_url": row[2],
+        "lead_title": row[4],
+        "company_name": row[3],
+        "domain": domain,
+    }
+
+
+def fan_out_failure(error: FanOutError) -> str:
+    """
+    Describe what could not be fetched, from the calls named by a fan-out error.
+    """
+    return "Failed to fetch " + " and ".join(FETCH_DESCRIPTIONS.get(call, call) for call in error.calls)
+
+
+def sheet_fetchers() -> Dict[str, Callable]:
+    """
+    The sheet read to fan out next to the CRM calls: none when matching queries the mirrored
+    sheet_rows table (SHEET_MATCH_BACKEND=database), so the sheet is never downloaded.
+    """
+    if current_app.config['SHEET_MATCH_BACKEND'] == 'database':
+        return {}
+    return {"sheet": get_google_sheet_snapshot}
+
+
+def match_and_save_lead(company_name: str, snapshot: Optional[SheetSnapshot],
+                        domain: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Matches a CRM company name against the sheet snapshot, or the sheet_rows table without one,
+    and saves the matched row as a lead.
+    :return: A tuple of the outcome and a human readable message.
+    """
+    row = find_matching_row(company_name, snapshot)
+    if not row:
+        logger.info("No matched company found in Google Sheets for '%s'.", company_name)
+        return OUTCOME_NO_MATCH, "No matched company found in Google Sheets."
+
+    # Companies this process knows as saved are confirmed with an indexed lookup instead of an
+    # insert attempt; the others go straight to the upsert
+    key = company_key(row[3])
+    if saved_company_keys.contains(key) and saved_company_keys.confirmed([key]):
+        logger.info("Skipping: Company '%s' already exists in the database.", row[3])
+        return OUTCOME_SKIPPED, f"Skipping: Company '{company_name}' already exists in the database."
+
+    with LEAD_SAVE_DURATION.labels('upsert').time():
+        lead_id, error = Lead.upsert(**lead_values_from_row(row, domain))
+    if error:
+        logger.error("Failed to save lead for '%s': %s", row[3], error)
+        return OUTCOME_ERROR, f"Failed to save lead for '{company_name}'."
+    saved_company_keys.add([key])
+    if lead_id is None:
+        logger.info("Skipping: Company '%s' already exists in the database.", row[3])
+        return OUTCOME_SKIPPED, f"Skipping: Company '{company_name}' already exists in the database."
+    logger.info("Lead for '%s' has been saved to the database.", row[3])
+    return OUTCOME_SAVED, f"Lead for '{company_name}' has been saved to the database."
+
+
+def invalidate_hubspot_caches(event: Dict) -> bool:
+    """
+    Drops the cached HubSpot data an event reports as changed, in every worker process.
+    :return: True if the event is a change notification rather than a contact to process.
+    """
+    subscription_type = event.get("subscriptionType") or ""
+    # Merge events name the surviving record and the records merged into it
+    merged_ids = [event.get(key) for key in ("primaryObjectId", "newObjectId") if event.get(key)]
+    merged_ids += event.get("mergedObjectIds") or []
+    if subscription_type in COMPANY_CHANGE_EVENTS:
+        invalidate_companies([event["objectId"]] + merged_ids)
+        return True
+    if subscription_type in ASSOCIATION_CHANGE_EVENTS:
+        object_ids = [event.get(key) for key in ("objectId", "fromObjectId", "toObjectId") if event.get(key)]
+        invalidate_contacts(object_ids + merged_ids)
+        return True
+    return False
+
+
+def process_hubspot_events(events: List[Dict]) -> Tuple[Optional[List[Dict]], Optional[str]]:
+    """
+    Processes a batch of HubSpot webhook events and counts their outcomes.
+    :return: See _process_hubspot_events.
+    """
+    results, error = _process_hubspot_events(events)
+    if error:
+        WEBHOOK_EVENTS.labels('hubspot', OUTCOME_ERROR).inc(len(events))
+    for result in results or []:
+        WEBHOOK_EVENTS.labels('hubspot', result["outcome"]).inc()
+    record_normalize_cache_metrics()
+    return results, error
+
+
+def _process_hubspot_events(events: List[Dict]) -> Tuple[Optional[List[Dict]], Optional[str]]:
+    """
+    Processes a batch of HubSpot webhook events.
+    Company change events only invalidate cached data. For contact events, company details are
+    fetched with batch API calls and the sheet is read once.
+    :return: A tuple of per-event results, in the order of the events, or None and an error
+        message or None when the whole batch could not be processed.
+    """
+    results = []
+    contact_events = []
+    for event in events:
+        result = {"eventId": event.get("eventId"), "objectId": event.get("objectId")}
+        subscription_type = event.get("subscriptionType") or "contact."
+        if invalidate_hubspot_caches(event):
+            result.update(outcome=OUTCOME_INVALIDATED, message="Cached HubSpot data invalidated")
+        elif subscription_type.startswith("contact.") and event.get("objectId"):
+            contact_events.append((event, result))
+        else:
+            result.update(outcome=OUTCOME_IGNORED, message=f"Ignored {subscription_type} event")
+        results.append(result)
+    if not contact_events:
+        return results, None
+
+    contact_ids = sorted({str(event["objectId"]) for event, _ in contact_events})
+    # The company lookup and the sheet read are independent, so they run concurrently
+    fetched, error = fan_out({
+        "companies": lambda: get_contacts_company_details(contact_ids),
+        **sheet_fetchers(),
+    }, timeout=current_app.config['FANOUT_TIMEOUT'])
+    if error:
+        message = fan_out_failure(error)
+        logger.error("%s for contacts %s: %s", message, contact_ids, error)
+        return None, f"{message}: {error}"
+    company_details, snapshot = fetched["companies"], fetched.get("sheet")
+
+    for event, result in contact_events:
+        contact_id = str(event["objectId"])
+        properties = company_details.get(contact_id)
+        if not properties:
+            logger.warning("No company associated with contact %s", contact_id)
+            result.update(outcome=OUTCOME_NO_COMPANY, message="No company associated")
+            continue
+        company_name = (properties.get("name") or "N/A").lower()
+        try:
+            outcome, message = match_and_save_lead(company_name, snapshot, domain=properties.get("domain", "N/A"))
+        except Exception as e:
+            logger.error("Error processing contact %s: %s", contact_id, e)
+            outcome, message = OUTCOME_ERROR, str(e)
+        result.update(outcome=outcome, message=message)
+    return results, None
+
+
+def process_pipedrive_lead(data: Dict) -> Tuple[Dict, int]:
+    """
+    Processes a Pipedrive "lead created" webhook payload and counts its outcome.
+    :return: See _process_pipedrive_lead.
+    """
+    result, status_code = _process_pipedrive_lead(data)
+    WEBHOOK_EVENTS.labels('pipedrive', result["outcome"]).inc()
+    record_normalize_cache_metrics()
+    return result, status_code
+
+
+def _process_pipedrive_lead(data: Dict) -> Tuple[Dict, int]:
+    """
+    Processes a Pipedrive "lead created" webhook payload.
+    :return: A tuple of the result (outcome, message and optional details) and the HTTP status
+        code matching it.
+    """
+    creator_id = data.get('data', {}).get('creator_id')
+    if not creator_id:
+        logger.warning("No creator_id found in the webhook data.")
+        return {"outcome": OUTCOME_ERROR, "message": "No creator_id found"}, 400
+
+    user_token = UserPipedriveToken.get_cached_token_by_creator_id(creator_id)
+    if not user_token:
+        logger.warning("No access token found for creator_id %s", creator_id)
+        return {"outcome": OUTCOME_ERROR, "message": f"No access token for creator_id {creator_id}"}, 404
+
+    organization_id = data['data'].get('organization_id')
+
+    # The organization fetch and the sheet read are independent, so they run concurrently;
+    # whichever fails first cancels the other. Pipedrive API errors are part of the
+    # organization result, so only exceptions and the deadline fail the organization call.
+    fetched, error = fan_out({
+        "organization": lambda: (fetch_organization_summary(organization_id, user_token.access_token, creator_id), None),
+        **sheet_fetchers(),
+    }, timeout=current_app.config['FANOUT_TIMEOUT'])
+    if error:
+        message = fan_out_failure(error)
+        logger.error("%s: %s", message, error)
+        return {"outcome": OUTCOME_ERROR, "message": message, "details": str(error)}, 500
+
+    organization_data = fetched["organization"]
+    if 'error' in organization_data:
+        error_details = organization_data.get('details', {})
+        logger.error("Failed to fetch organization data")
+        logger.error(error_details)
+        return {"outcome": OUTCOME_ERROR, "message": "Failed to fetch organization data", "details": error_details}, 401
+
+    snapshot = fetched.get("sheet")
+    company_name = organization_data['data']['name']
+
+    outcome, message = match_and_save_lead(company_name, snapshot, domain=organization_data['data']['domain'])
+    return {"outcome": outcome, "message": message}, 200
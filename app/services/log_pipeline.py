@@ -0,0 +1,163 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from cachetools import LRUCache
+
+from app.services.metrics import LOG_RECORDS_DROPPED
+
+
+def parse_sample_rates(value: str) -> Dict[str, int]:
+    """
+    Parse "Request successful for URL=100,Skipping: Company=10" into a message template
+    prefix -> N mapping: one record in N whose template starts with the prefix is kept.
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        prefix, _, rate = item.rpartition('=')
+        if prefix and int(rate) > 1:
+            rates[prefix] = int(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one record in N per message template for high-volume lines.
+    Records are grouped by their unformatted message (record.msg), so the arguments of a lazily
+    formatted call do not split a template into many groups. Warnings and errors are never sampled.
+    Messages formatted before the call (f-strings) each form their own group, so the groups are
+    kept in LRU caches of ``max_templates`` entries.
+    """
+
+    def __init__(self, rates: Dict[str, int], max_templates: int = 1024):
+        super().__init__()
+        self.rates = rates
+        self._template_rates = LRUCache(maxsize=max_templates)
+        self._counts = LRUCache(maxsize=max_templates)
+        self._lock = threading.Lock()
+
+    def _rate(self, template: str) -> int:
+        rate = self._template_rates.get(template)
+        if rate is None:
+            rate = next((n for prefix, n in self.rates.items() if template.startswith(prefix)), 1)
+            self._template_rates[template] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.rates or record.levelno >= logging.WARNING or not isinstance(record.msg, str):
+            return True
+        with self._lock:
+            rate = self._rate(record.msg)
+            if rate == 1:
+                return True
+            count = self._counts.get(record.msg, 0)
+            self._counts[record.msg] = count + 1
+        if count % rate == 0:
+            record.sample_rate = rate
+            return True
+        LOG_RECORDS_DROPPED.labels('sampled').inc()
+        return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without ever blocking the caller: when the bounded
+    queue is full the record is dropped and counted instead.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue never leaves the process, so the record is not pickled and the traceback is
+        # formatted by the listener. Only the message is merged here, as its arguments may be
+        # mutated once the logging call returns.
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels('queue_full').inc()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, for log collectors.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if getattr(record, 'sample_rate', None):
+            entry["sample_rate"] = record.sample_rate
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+
+
+def configure_logging(level: str = 'INFO', log_format: str = 'text', queue_size: int = 10000,
+                      sample_rates: Optional[Dict[str, int]] = None) -> None:
+    """
+    Route all records through a bounded in-memory queue to a listener thread that does the
+    formatting and I/O, so a slow or blocked stderr never stalls a request.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    if log_format == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    _queue_handler.addFilter(SamplingFilter(sample_rates or {}))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+
+    _listener = QueueListener(_queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
+
+
+def _stop_listener() -> None:
+    # Flushes the records still queued at interpreter exit
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def _restart_listener_after_fork() -> None:
+    # The listener thread does not survive fork, and the queue's locks may have been held by it;
+    # forked workers get a fresh queue and their own listener
+    if _listener is None:
+        return
+    _queue_handler.queue = queue.Queue(maxsize=_queue_handler.queue.maxsize)
+    _listener.queue = _queue_handler.queue
+    _listener._thread = None
+    _listener.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
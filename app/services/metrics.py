@@ -0,0 +1,79 @@
+import os
+from typing import Tuple
+
+from app.config import Config
+
+# With several gunicorn workers, PROMETHEUS_MULTIPROC_DIR must point to a directory shared by
+# them (emptied on startup, see gunicorn.conf.py); every worker then writes its samples there
+# and /metrics aggregates all of them, whichever worker serves the scrape.
+MULTIPROCESS_DIR = Config.PROMETHEUS_MULTIPROC_DIR
+# prometheus_client turns multiprocess mode on when the variable merely exists, blank or not,
+# so a blank value must be gone before it is imported
+if not MULTIPROCESS_DIR:
+    os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+UPSTREAM_REQUESTS = Counter(
+    'upstream_requests_total', 'Outbound HTTP requests by upstream host and response status.',
+    ['upstream', 'method', 'status'],
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    'upstream_request_duration_seconds', 'Outbound HTTP request duration by upstream host.',
+    ['upstream'],
+)
+COMPANY_MATCH_DURATION = Histogram(
+    'company_match_duration_seconds', 'Time spent matching one company name against the sheet.',
+    ['matcher'], buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+COMPANY_MATCH_ROWS_SCANNED = Histogram(
+    'company_match_rows_scanned', 'Index entries read to match one company name.',
+    ['matcher'], buckets=(1, 10, 100, 1000, 10000, 100000, 1000000),
+)
+LEAD_SAVE_DURATION = Histogram(
+    'lead_save_duration_seconds', 'Time spent writing leads to the database.',
+    ['operation'],
+)
+CACHE_LOOKUPS = Counter(
+    'cache_lookups_total', 'Process-local cache lookups by cache and result.',
+    ['cache', 'result'],
+)
+CACHE_ENTRIES = Gauge(
+    'cache_entries', 'Entries held by a process-local cache, in its fullest live process.',
+    ['cache'], multiprocess_mode='livemax',
+)
+WEBHOOK_EVENTS = Counter(
+    'webhook_events_total', 'Processed webhook events by source and outcome.',
+    ['source', 'outcome'],
+)
+SHEET_SYNCS = Counter(
+    'sheet_syncs_total', 'Google Sheet syncs by kind (full, append, edits, unchanged).',
+    ['kind'],
+)
+LOG_RECORDS_DROPPED = Counter(
+    'log_records_dropped_total', 'Log records discarded by sampling or because the log queue was full.',
+    ['reason'],
+)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format, aggregated over the worker processes
+    when PROMETHEUS_MULTIPROC_DIR is set.
+    :return: A tuple of the response body and its content type.
+    """
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """
+    Drop the live samples of an exited worker process; its counters are kept.
+    """
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(pid)
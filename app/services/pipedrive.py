@@ -1,22 +1,38 @@
 import os
-import requests
+from urllib.parse import urlsplit
+from cachetools import TTLCache
+from app.config import Config
+from app.services import http_client
+from app.services.cache import StatsCache
 from app.utils import logger
 
 PIPEDRIVE_BASE_URL_V1 = os.getenv("PIPEDRIVE_BASE_URL_V1"),
+# Host of the REST API (v1 and v2 paths); overridable to point at a stand-in server
+PIPEDRIVE_API_BASE_URL = Config.PIPEDRIVE_API_BASE_URL
+
+# (account, organization_id) -> {"name", "domain"}; misses for deleted organizations live shorter
+organization_cache = StatsCache(TTLCache(
+    maxsize=Config.PIPEDRIVE_ORG_CACHE_SIZE,
+    ttl=Config.PIPEDRIVE_ORG_CACHE_TTL,
+), name='pipedrive_organizations')
+organization_not_found_cache = StatsCache(TTLCache(
+    maxsize=Config.PIPEDRIVE_ORG_CACHE_SIZE,
+    ttl=Config.PIPEDRIVE_ORG_NEGATIVE_TTL,
+), name='pipedrive_organizations_not_found')
 
 
 def manage_webhook(access_token: str, subscription_url: str) -> dict or None:
     """Manages Pipedrive webhooks."""
-    url = "https://api.pipedrive.com/v1/webhooks"
+    url = f"{PIPEDRIVE_API_BASE_URL}/v1/webhooks"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
     }
 
     # Check for existing webhooks
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, headers=headers)
     if response.status_code != 200:
-        logger.error(f"Failed to fetch existing webhooks: {response.json()}")
+        logger.error("Failed to fetch existing webhooks: %s", response.json())
         return None
 
     webhooks = response.json().get('data', [])
@@ -37,13 +53,13 @@ def manage_webhook(access_token: str, subscription_url: str) -> dict or None:
         "event_object": "lead",
         "subscription_url": subscription_url
     }
-    response = requests.post(url, json=payload, headers=headers)
+    response = http_client.post(url, json=payload, headers=headers)
 
     if response.status_code == 201:
         logger.info("Webhook created successfully.")
         return None
     else:
-        logger.error(f"Failed to create webhook: {response.json()}")
+        logger.error("Failed to create webhook: %s", response.json())
         return None
 
 
@@ -61,36 +77,146 @@ def fetch_organization_data_with_token(organization_id: str, access_token: str)
     if not access_token:
         return {"error": "Access token is missing."}
     # url = f"{PIPEDRIVE_BASE_URL_V1}/organizations/{organization_id}"
-    url = f"https://api.pipedrive.com/v1/organizations/{organization_id}"
+    url = f"{PIPEDRIVE_API_BASE_URL}/v1/organizations/{organization_id}"
 
     try:
         headers = {
             "Authorization": f"Bearer {access_token}"
         }
-        response = requests.get(url, headers=headers)
+        response = http_client.get(url, headers=headers)
         if response.status_code == 200:
             return response.json()  # Return organization data
         else:
             return {
                 "error": f"Failed to fetch organization. Status code: {response.status_code}",
-                "details": response.text
+                "details": response.text,
+                "status_code": response.status_code
             }
     except Exception as e:
-        logger.error(f"An exception occurred while fetching organization data.: {str(e)}")
+        logger.error("An exception occurred while fetching organization data.: %s", e)
         return {"error": "An exception occurred while fetching organization data.", "details": str(e)}
 
 
+def website_domain(website: str) -> str or None:
+    if not website:
+        return None
+    return urlsplit(website if '//' in website else f"//{website}").hostname
+
+
+def fetch_organization_summary(organization_id: str, access_token: str, account_id) -> dict:
+    """
+    Cached variant of fetch_organization_data_with_token keeping only the fields we use.
+
+    Args:
+        organization_id (int): The ID of the organization to fetch.
+        access_token (str): The OAuth access token.
+        account_id: The Pipedrive account the token belongs to (its creator_id).
+
+    Returns:
+        dict: {"data": {"name": ..., "domain": ...}} if successful, or an error message.
+            A 404 is remembered for PIPEDRIVE_ORG_NEGATIVE_TTL seconds.
+    """
+    key = (account_id, str(organization_id))
+    summary = organization_cache.get(key)
+    if summary is not None:
+        return {"data": summary}
+    not_found = organization_not_found_cache.get(key)
+    if not_found is not None:
+        return not_found
+
+    organization_data = fetch_organization_data_with_token(organization_id, access_token)
+    if 'error' in organization_data:
+        if organization_data.get('status_code') == 404:
+            organization_not_found_cache.set(key, organization_data)
+        return organization_data
+
+    data = organization_data.get('data') or {}
+    summary = {"name": data.get('name'), "domain": website_domain(data.get('website'))}
+    organization_cache.set(key, summary)
+    return {"data": summary}
+
+
+def organization_cache_stats() -> dict:
+    return {"organizations": organization_cache.stats(), "not_found": organization_not_found_cache.stats()}
+
+
 def fetch_creator_id_with_token(access_token):
     try:
-        url = 'https://api.pipedrive.com/v1/users/me'
+        url = f'{PIPEDRIVE_API_BASE_URL}/v1/users/me'
         headers = {
             'Authorization': f'Bearer {access_token}'
         }
-        response = requests.get(url, headers=headers)
+        response = http_client.get(url, headers=headers)
         if response.status_code == 200:
             user_data = response.json()
             return user_data['data']['id']  # Extract the creator_id from the response
         else:
             raise Exception(f"Failed to fetch user details: {response.status_code} - {response.text}")
     except Exception as e:
-        logger.error(f"An exception occurred while fetching user data.: {str(e)}")
+        logger.error("An exception occurred while fetching user data.: %s", e)
+
+
+def list_leads_page(access_token: str, start: int = 0, limit: int = 500) -> dict:
+    """
+    Fetches one page of leads of the token's account.
+
+    Args:
+        access_token (str): The OAuth access token.
+        start (int): Pagination cursor returned by the previous page.
+        limit (int): Page size, at most 500.
+
+    Returns:
+        dict: {"leads": [...], "next_start": int or None}, or an error message.
+    """
+    url = f"{PIPEDRIVE_API_BASE_URL}/v1/leads"
+    try:
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = http_client.get(url, headers=headers, params={"start": start, "limit": limit})
+        if response.status_code != 200:
+            return {
+                "error": f"Failed to fetch leads. Status code: {response.status_code}",
+                "details": response.text
+            }
+        response_data = response.json()
+        pagination = (response_data.get("additional_data") or {}).get("pagination") or {}
+        next_start = pagination.get("next_start") if pagination.get("more_items_in_collection") else None
+        return {"leads": response_data.get("data") or [], "next_start": next_start}
+    except Exception as e:
+        logger.error("An exception occurred while fetching leads.: %s", e)
+        return {"error": "An exception occurred while fetching leads.", "details": str(e)}
+
+
+def fetch_organizations_by_ids(organization_ids: list, access_token: str) -> dict:
+    """
+    Fetches several organizations at once with the v2 API, following its cursor pagination.
+
+    Args:
+        organization_ids (list): At most 100 organization IDs.
+        access_token (str): The OAuth access token.
+
+    Returns:
+        dict: {"organizations": {id: organization}}, or an error message. The organizations are
+            the v2 objects, with the name and website the lead domain comes from.
+    """
+    url = f"{PIPEDRIVE_API_BASE_URL}/api/v2/organizations"
+    headers = {"Authorization": f"Bearer {access_token}"}
+    params = {"ids": ",".join(str(organization_id) for organization_id in organization_ids), "limit": 100}
+    organizations = {}
+    try:
+        while True:
+            response = http_client.get(url, headers=headers, params=params)
+            if response.status_code != 200:
+                return {
+                    "error": f"Failed to fetch organizations. Status code: {response.status_code}",
+                    "details": response.text
+                }
+            response_data = response.json()
+            for organization in response_data.get("data") or []:
+                organizations[organization["id"]] = organization
+            next_cursor = (response_data.get("additional_data") or {}).get("next_cursor")
+            if not next_cursor:
+                return {"organizations": organizations}
+            params["cursor"] = next_cursor
+    except Exception as e:
+        logger.error("An exception occurred while fetching organizations.: %s", e)
+        return {"error": "An exception occurred while fetching organizations.", "details": str(e)}
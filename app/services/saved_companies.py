@@ -0,0 +1,99 @@
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from app.database import db
+from app.models import Lead
+from app.services.metrics import CACHE_LOOKUPS
+from app.utils import logger
+
+
+class SavedCompanyKeys:
+    """
+    Process-local set of the normalized company keys already saved as leads.
+
+    Loaded from the leads table at startup (or on first use) and extended whenever this process
+    saves (or finds) a lead. The set is only a hint. A key missing from it is not proof that the
+    company is new, since another process may have saved it since, so inserts still go through
+    Lead.upsert. A key found in it is confirmed with an indexed lookup (see confirmed), which
+    also forgets leads deleted from the table, before a lead is skipped.
+    """
+
+    def __init__(self):
+        self._keys: Set[str] = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> None:
+        """
+        Warm the set from the leads table; later calls are no-ops.
+        """
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            rows = db.session.query(Lead.company_key).filter(Lead.company_key.isnot(None)).yield_per(10000)
+            self._keys.update(key for key, in rows)
+            self._loaded = True
+            logger.info("Loaded %s saved company keys.", len(self._keys))
+
+    def warm(self) -> None:
+        """
+        Load the set when a process starts, so the first request does not pay for it. A database
+        that is not reachable (or not migrated) yet leaves the set to load on first use.
+        """
+        try:
+            self.load()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("Could not load saved company keys at startup: %s", e)
+
+    def contains(self, key: Optional[str]) -> bool:
+        if not key:
+            return False
+        self.load()
+        found = key in self._keys
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        CACHE_LOOKUPS.labels('saved_companies', 'hit' if found else 'miss').inc()
+        return found
+
+    def confirmed(self, keys: List[str]) -> Set[str]:
+        """
+        The given keys that the leads table still holds; the others are dropped from the set.
+        """
+        if not keys:
+            return set()
+        stored = {key for key, in db.session.query(Lead.company_key).filter(Lead.company_key.in_(keys))}
+        forgotten = set(keys) - stored
+        if forgotten:
+            with self._lock:
+                self._keys.difference_update(forgotten)
+            logger.info("Forgot %s saved company keys no longer in the database.", len(forgotten))
+        return stored
+
+    def add(self, keys: Iterable[Optional[str]]) -> None:
+        with self._lock:
+            self._keys.update(key for key in keys if key)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._keys = set()
+            self._loaded = False
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._keys),
+            "loaded": self._loaded,
+        }
+
+
+saved_company_keys = SavedCompanyKeys()
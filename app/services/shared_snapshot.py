@@ -0,0 +1,267 @@
+import fcntl
+import json
+import mmap
+import os
+import re
+import tempfile
+import time
+from collections.abc import Sequence
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from app.services.company_matcher import FuzzyCompanyMatcher
+from app.services.metrics import CACHE_LOOKUPS
+from app.services.sheet_cache import SheetCache, SheetGeneration, SheetSnapshot
+from app.services.sheet_sync import SheetSync, row_hashes
+from app.utils import logger
+
+SNAPSHOT_MAGIC = b'SHEETSNP'
+SNAPSHOT_FORMAT = 1
+# Arrays start on cache line boundaries
+ARRAY_ALIGNMENT = 64
+POINTER_FILE = 'current.json'
+LOCK_FILE = '.lock'
+SNAPSHOT_FILE_RE = re.compile(r'^snapshot-(\d+)\.bin$')
+MATCHER_ARRAYS = ('features', 'offsets', 'postings', 'idf', 'row_norms')
+
+
+class MappedRows(Sequence):
+    """
+    Read-only sheet rows backed by a mapped snapshot file; a row is decoded from its JSON bytes
+    only when accessed.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('sheet row index out of range')
+        return json.loads(self._data[self._offsets[index]:self._offsets[index + 1]].tobytes())
+
+
+def write_snapshot_file(path: str, rows: list, revision: Optional[str], version: int) -> None:
+    """
+    Write the rows and their match index as one binary file: the magic, a little-endian uint32
+    header length, a JSON header describing every array, then the arrays, each aligned to
+    ARRAY_ALIGNMENT bytes.
+    """
+    encoded = [json.dumps(row, separators=(',', ':')).encode('utf-8') for row in rows]
+    row_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in encoded], out=row_offsets[1:])
+    matcher = FuzzyCompanyMatcher.from_rows(rows)
+    arrays = {
+        'row_offsets': row_offsets,
+        'row_data': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        'row_hashes': row_hashes(rows),
+    }
+    arrays.update((name, getattr(matcher, name)) for name in MATCHER_ARRAYS)
+
+    layout = {}
+    position = 0
+    for name, array in arrays.items():
+        position = -(-position // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+        layout[name] = {"dtype": array.dtype.str, "offset": position, "count": len(array)}
+        position += array.nbytes
+    header = json.dumps({"format": SNAPSHOT_FORMAT, "version": version, "revision": revision,
+                         "rows": len(rows), "arrays": layout}).encode('utf-8')
+    data_start = -(-(len(SNAPSHOT_MAGIC) + 4 + len(header)) // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+    with open(path, 'wb') as file:
+        file.write(SNAPSHOT_MAGIC + len(header).to_bytes(4, 'little') + header)
+        for name, array in arrays.items():
+            file.seek(data_start + layout[name]["offset"])
+            file.write(np.ascontiguousarray(array).data)
+        # Empty trailing arrays still need their offset inside the file
+        file.truncate(data_start + position)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def map_snapshot_file(path: str) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """
+    Map a snapshot file read-only.
+    :return: A tuple of the header and the arrays, which are views of the shared mapping.
+    """
+    with open(path, 'rb') as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapping[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a sheet snapshot file")
+    header_start = len(SNAPSHOT_MAGIC) + 4
+    header_length = int.from_bytes(mapping[len(SNAPSHOT_MAGIC):header_start], 'little')
+    header = json.loads(mapping[header_start:header_start + header_length])
+    if header["format"] != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported sheet snapshot format {header['format']} in {path}")
+    data_start = -(-(header_start + header_length) // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+    arrays = {
+        name: np.frombuffer(mapping, dtype=np.dtype(spec["dtype"]), count=spec["count"],
+                            offset=data_start + spec["offset"])
+        for name, spec in header["arrays"].items()
+    }
+    return header, arrays
+
+
+class SharedSheetCache(SheetCache):
+    """
+    Sheet cache shared by the worker processes of one host through files in ``directory``.
+
+    Every sheet version is written once, with its fuzzy match index, to an immutable
+    snapshot-<version>.bin file that all workers map read-only, so the page cache holds a
+    single copy. current.json names the live file along with its revision and check times and
+    is replaced atomically (os.replace), which makes workers switch to a new version on their
+    next lookup. Refreshes are serialized by an flock, so one worker downloads and the others
+    reuse its result. The full resync and edit check times of ``sync`` are kept in current.json
+    too, so its intervals apply to the host rather than to every worker.
+    """
+
+    def __init__(self, directory: str, ttl: float = 60, max_age: float = 3600,
+                 generation: Optional[SheetGeneration] = None, sync: Optional[SheetSync] = None):
+        super().__init__(ttl=ttl, max_age=max_age, generation=generation)
+        self.directory = directory
+        self.sync = sync
+        self._pointer_stat: Optional[Tuple[int, int]] = None
+        self._pointer: Optional[Dict] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, fetch_rows, fetch_revision) -> Tuple[Optional[SheetSnapshot], Optional[str]]:
+        generation = self.generation.current() if self.generation else None
+        snapshot = self._current_snapshot(generation)
+        if self._is_fresh(snapshot, generation, time.time()):
+            CACHE_LOOKUPS.labels('google_sheet', 'hit').inc()
+            return snapshot, None
+
+        # One thread per process, then one process per host
+        with self._lock, self._file_lock():
+            snapshot = self._current_snapshot(generation)
+            now = time.time()
+            if self._is_fresh(snapshot, generation, now):
+                CACHE_LOOKUPS.labels('google_sheet', 'hit').inc()
+                return snapshot, None
+            return self._refresh(snapshot, generation, now, fetch_rows, fetch_revision)
+
+    def _refresh(self, snapshot: Optional[SheetSnapshot], generation: Optional[Tuple[int, int]], now: float,
+                 fetch_rows, fetch_revision) -> Tuple[Optional[SheetSnapshot], Optional[str]]:
+        # Continue from the sync times of whichever worker refreshed last
+        pointer = self._read_pointer()
+        if self.sync and pointer:
+            self.sync.last_full_sync = pointer.get("last_full_sync", 0.0)
+            self.sync.last_edit_check = pointer.get("last_edit_check", 0.0)
+        return super()._refresh(snapshot, generation, now, fetch_rows, fetch_revision)
+
+    def _sync_times(self) -> Dict[str, float]:
+        if not self.sync:
+            return {}
+        return {"last_full_sync": self.sync.last_full_sync, "last_edit_check": self.sync.last_edit_check}
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _read_pointer(self) -> Optional[Dict]:
+        path = os.path.join(self.directory, POINTER_FILE)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if (stat.st_ino, stat.st_mtime_ns) != self._pointer_stat:
+            with open(path) as file:
+                self._pointer = json.load(file)
+            self._pointer_stat = (stat.st_ino, stat.st_mtime_ns)
+        return self._pointer
+
+    def _write_pointer(self, pointer: Dict) -> None:
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory, prefix='.current-')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(pointer, file)
+        os.replace(temporary_path, os.path.join(self.directory, POINTER_FILE))
+
+    def _current_snapshot(self, generation: Optional[Tuple[int, int]]) -> Optional[SheetSnapshot]:
+        """
+        The snapshot named by current.json, mapping its file if this process has not yet.
+        """
+        pointer = self._read_pointer()
+        if pointer is None:
+            return None
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != pointer["version"]:
+            try:
+                snapshot = self._map(pointer)
+            except FileNotFoundError:
+                # Replaced and cleaned up between reading the pointer and opening the file
+                self._pointer_stat = None
+                pointer = self._read_pointer()
+                if pointer is None:
+                    # Invalidated meanwhile: the caller refetches
+                    return None
+                snapshot = self._map(pointer)
+            self._snapshot = snapshot
+        snapshot.revision = pointer["revision"]
+        snapshot.fetched_at = pointer["fetched_at"]
+        snapshot.checked_at = pointer["checked_at"]
+        # Checked after the last change notification: counts as validated against it
+        checked_since_notification = generation is None or generation[1] <= pointer["checked_at"] * 1e9
+        snapshot.generation = generation if checked_since_notification else None
+        return snapshot
+
+    def _map(self, pointer: Dict) -> SheetSnapshot:
+        header, arrays = map_snapshot_file(os.path.join(self.directory, pointer["file"]))
+        snapshot = SheetSnapshot(MappedRows(arrays['row_data'], arrays['row_offsets']), header["revision"],
+                                 pointer["fetched_at"], header["version"])
+        # Files written before the hashes covered whole rows only have key_hashes
+        snapshot.derived('row_hashes',
+                         lambda rows: arrays['row_hashes'] if 'row_hashes' in arrays else row_hashes(rows))
+        snapshot.derived('fuzzy_matcher', lambda _rows: FuzzyCompanyMatcher(*(arrays[name] for name in MATCHER_ARRAYS)))
+        logger.info("Mapped shared sheet snapshot %s.", pointer["file"])
+        return snapshot
+
+    def _renew(self, snapshot: SheetSnapshot, now: float, generation: Optional[Tuple[int, int]]) -> None:
+        super()._renew(snapshot, now, generation)
+        pointer = dict(self._read_pointer(), revision=snapshot.revision, fetched_at=snapshot.fetched_at,
+                       checked_at=now, **self._sync_times())
+        self._write_pointer(pointer)
+
+    def _store(self, rows: list, revision: Optional[str], now: float,
+               generation: Optional[Tuple[int, int]]) -> SheetSnapshot:
+        pointer = self._read_pointer()
+        # Never reuse a version number: workers keep the mapping of the version they last saw
+        versions = [int(match.group(1)) for match in map(SNAPSHOT_FILE_RE.match, os.listdir(self.directory)) if match]
+        version = max(versions + [pointer["version"] if pointer else 0]) + 1
+        file_name = f'snapshot-{version:012d}.bin'
+        temporary_path = os.path.join(self.directory, f'.{file_name}.tmp')
+        write_snapshot_file(temporary_path, rows, revision, version)
+        os.replace(temporary_path, os.path.join(self.directory, file_name))
+        self._write_pointer({"file": file_name, "version": version, "revision": revision,
+                             "fetched_at": now, "checked_at": now, **self._sync_times()})
+        self._remove_old_files(keep={file_name, pointer["file"] if pointer else None})
+        return self._current_snapshot(generation)
+
+    def _remove_old_files(self, keep: set) -> None:
+        # Workers still mapping a removed file keep their mapping until they switch versions
+        for name in os.listdir(self.directory):
+            if SNAPSHOT_FILE_RE.match(name) and name not in keep:
+                os.remove(os.path.join(self.directory, name))
+
+    def invalidate(self) -> None:
+        with self._lock, self._file_lock():
+            try:
+                os.remove(os.path.join(self.directory, POINTER_FILE))
+            except FileNotFoundError:
+                pass
+            self._snapshot = None
+            self._pointer_stat = self._pointer = None
+        logger.info("Shared Google Sheet cache invalidated.")
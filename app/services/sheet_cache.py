@@ -0,0 +1,172 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional, Tuple
+
+from app.services.metrics import CACHE_LOOKUPS
+from app.utils import logger
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class SheetSnapshot:
+    """
+    The Google Sheet rows at a given revision.
+
+    The rows of a snapshot are never modified; a new snapshot is created every time the sheet
+    content changes, so anything derived from the rows can be cached on the snapshot itself.
+    """
+
+    def __init__(self, rows: list, revision: Optional[str], fetched_at: float, version: int):
+        self.rows = rows
+        self.revision = revision
+        self.fetched_at = fetched_at
+        self.checked_at = fetched_at
+        self.version = version
+        # SheetGeneration value the snapshot was last validated against
+        self.generation = None
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    def derived(self, key: str, builder: Callable[[list], Any]) -> Any:
+        """
+        Return a structure computed from the rows, building it once per snapshot.
+        """
+        value = self._derived.get(key)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = builder(self.rows)
+                    self._derived[key] = value
+        return value
+
+    def __repr__(self):
+        return f'<SheetSnapshot v{self.version} rows={len(self.rows)} revision={self.revision}>'
+
+
+class SheetGeneration:
+    """
+    Change marker of the sheet shared by the worker processes of every host through cache
+    invalidations (see app.services.cache_invalidation). A bump records an entry of the
+    google_sheet cache; the generation is the id and time (in nanoseconds) of the latest entry
+    this process has seen, which it checks at most once per poll interval.
+    """
+
+    CACHE_NAME = 'google_sheet'
+
+    def __init__(self, invalidations):
+        self.invalidations = invalidations
+        self._current: Optional[Tuple[int, int]] = None
+        invalidations.subscribe(self.CACHE_NAME, self._apply)
+
+    def current(self) -> Optional[Tuple[int, int]]:
+        self.invalidations.poll()
+        return self._current
+
+    def bump(self) -> None:
+        self.invalidations.publish(self.CACHE_NAME, [None])
+
+    def _apply(self, entries: list) -> None:
+        entry_id, _object_id, created_at = entries[-1]
+        self._current = (entry_id, (created_at - EPOCH) // timedelta(microseconds=1) * 1000)
+
+
+class SheetCache:
+    """
+    Process-local cache of the sheet snapshot.
+
+    Within ``ttl`` seconds the cached snapshot is served without any network call. Once the
+    TTL has elapsed, a cheap revision lookup decides whether the rows must be downloaded again;
+    if the revision is unchanged the snapshot is simply renewed. ``max_age`` bounds how long a
+    snapshot may be renewed this way before a full refetch is forced. A bumped ``generation``
+    (a change notification) makes the snapshot stale before its TTL and skips the revision check.
+    """
+
+    def __init__(self, ttl: float = 60, max_age: float = 3600, generation: Optional[SheetGeneration] = None):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.generation = generation
+        self._snapshot: Optional[SheetSnapshot] = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, fetch_rows: Callable[[Optional[SheetSnapshot]], Tuple[Optional[list], Optional[str]]],
+            fetch_revision: Callable[[], Optional[str]]) -> Tuple[Optional[SheetSnapshot], Optional[str]]:
+        """
+        Return the current snapshot, refreshing it through the given fetchers when stale.
+        ``fetch_rows`` receives the current snapshot (or None), so it may only fetch what changed;
+        returning that snapshot's own rows list means nothing changed.
+        :return: A tuple of the snapshot or None and an error message or None.
+        """
+        generation = self.generation.current() if self.generation else None
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot, generation, time.time()):
+            CACHE_LOOKUPS.labels('google_sheet', 'hit').inc()
+            return snapshot, None
+
+        # Only one thread per process refreshes; the others wait and reuse its result.
+        with self._lock:
+            snapshot = self._snapshot
+            now = time.time()
+            if self._is_fresh(snapshot, generation, now):
+                CACHE_LOOKUPS.labels('google_sheet', 'hit').inc()
+                return snapshot, None
+
+            return self._refresh(snapshot, generation, now, fetch_rows, fetch_revision)
+
+    def _refresh(self, snapshot: Optional[SheetSnapshot], generation: Optional[Tuple[int, int]], now: float,
+                 fetch_rows: Callable[[Optional[SheetSnapshot]], Tuple[Optional[list], Optional[str]]],
+                 fetch_revision: Callable[[], Optional[str]]) -> Tuple[Optional[SheetSnapshot], Optional[str]]:
+        revision = fetch_revision()
+        # After a change notification the Drive version may lag behind, so the rows are synced anyway
+        notified = snapshot is not None and snapshot.generation != generation
+        if snapshot and not notified and revision and revision == snapshot.revision \
+                and now - snapshot.fetched_at < self.max_age:
+            logger.info("Google Sheet unchanged at revision %s, renewing cached snapshot.", revision)
+            self._renew(snapshot, now, generation)
+            CACHE_LOOKUPS.labels('google_sheet', 'revalidated').inc()
+            return snapshot, None
+
+        CACHE_LOOKUPS.labels('google_sheet', 'miss').inc()
+        rows, error = fetch_rows(snapshot)
+        if error:
+            if snapshot:
+                logger.warning("Serving stale sheet snapshot after refresh failure: %s", error)
+                CACHE_LOOKUPS.labels('google_sheet', 'stale').inc()
+                return snapshot, None
+            return None, error
+
+        if snapshot and rows is snapshot.rows:
+            logger.info("Google Sheet content unchanged at revision %s, renewing cached snapshot.", revision)
+            snapshot.revision = revision
+            snapshot.fetched_at = now
+            self._renew(snapshot, now, generation)
+            return snapshot, None
+
+        snapshot = self._store(rows, revision, now, generation)
+        logger.info("Google Sheet snapshot refreshed: %s", snapshot)
+        return snapshot, None
+
+    def _renew(self, snapshot: SheetSnapshot, now: float, generation: Optional[Tuple[int, int]]) -> None:
+        snapshot.checked_at = now
+        snapshot.generation = generation
+
+    def _store(self, rows: list, revision: Optional[str], now: float,
+               generation: Optional[Tuple[int, int]]) -> SheetSnapshot:
+        self._version += 1
+        self._snapshot = SheetSnapshot(rows, revision, now, self._version)
+        self._snapshot.generation = generation
+        return self._snapshot
+
+    def _is_fresh(self, snapshot: Optional[SheetSnapshot], generation: Optional[Tuple[int, int]],
+                  now: float) -> bool:
+        return bool(snapshot) and now - snapshot.checked_at < self.ttl and snapshot.generation == generation
+
+    def invalidate(self) -> None:
+        """
+        Drop the cached snapshot so the next read downloads the sheet again.
+        """
+        with self._lock:
+            self._snapshot = None
+        logger.info("Google Sheet cache invalidated.")
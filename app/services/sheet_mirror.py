@@ -0,0 +1,86 @@
+import hashlib
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from app.database import db
+from app.models import SheetRow, SyncCheckpoint, company_key
+from app.services.metrics import COMPANY_MATCH_DURATION
+from app.services.sheet_cache import SheetSnapshot
+from app.utils import logger, normalize_name
+
+SHEET_MIRROR_CHECKPOINT = 'sheet_rows'
+# Rows written per INSERT ... ON CONFLICT statement
+SYNC_BATCH_SIZE = 1000
+SHEET_COLUMNS = ('adviser_name', 'lead_name', 'linkedin_url', 'company_name', 'lead_title')
+
+
+def mirror_row_values(row_number: int, row: list) -> Dict[str, Any]:
+    """
+    Map a sheet row (1-based row number) to SheetRow column values.
+    """
+    cells = [row[i] if i < len(row) else None for i in range(len(SHEET_COLUMNS))]
+    key = company_key(cells[3])
+    values = dict(zip(SHEET_COLUMNS, cells))
+    values.update(
+        row_number=row_number,
+        company_key=key,
+        name_tokens=list(dict.fromkeys(key.split())) if key else [],
+        content_hash=hashlib.sha1(json.dumps(cells).encode('utf-8')).hexdigest(),
+    )
+    return values
+
+
+def sync_sheet_rows(snapshot: SheetSnapshot, force: bool = False) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Bring the sheet_rows table up to date with a sheet snapshot. Only rows whose content hash
+    changed are written, and rows past the end of the sheet are deleted. Nothing is compared
+    when the snapshot revision is the one last synced, unless ``force`` is set.
+    :return: A tuple of the sync statistics or None and an error message or None.
+    """
+    stats = {"rows": len(snapshot.rows), "revision": snapshot.revision, "updated": 0, "deleted": 0}
+    if not force and snapshot.revision and SyncCheckpoint.get_cursor(SHEET_MIRROR_CHECKPOINT) == snapshot.revision:
+        return stats, None
+
+    try:
+        stored_hashes = SheetRow.content_hashes()
+        changed = []
+        for index, row in enumerate(snapshot.rows):
+            values = mirror_row_values(index + 1, row)
+            if stored_hashes.get(values["row_number"]) != values["content_hash"]:
+                changed.append(values)
+        for offset in range(0, len(changed), SYNC_BATCH_SIZE):
+            SheetRow.upsert_rows(changed[offset:offset + SYNC_BATCH_SIZE])
+        stats["updated"] = len(changed)
+        stats["deleted"] = SheetRow.delete_from(len(snapshot.rows) + 1)
+        SyncCheckpoint.save_cursor(SHEET_MIRROR_CHECKPOINT, snapshot.revision)
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error syncing sheet rows: %s", e)
+        return None, f"Error: {str(e)}"
+    logger.info("Synced sheet rows: %s", stats)
+    return stats, None
+
+
+def find_mirrored_row(company_name: str, matcher: str) -> Optional[List]:
+    """
+    Find the sheet row matching the given CRM company name in the sheet_rows table, with one
+    indexed query: "token" returns the first row sharing a name token, "fuzzy" the most
+    trigram-similar company key (Postgres only; other databases use the token query).
+    :return: The matching row in sheet column order or None.
+    """
+    key = normalize_name(company_name)
+    if not key:
+        return None
+    started = time.perf_counter()
+    if matcher == 'fuzzy' and db.session.get_bind().dialect.name == 'postgresql':
+        query = 'fuzzy'
+        row = SheetRow.find_most_similar(key, current_app.config['SHEET_MATCH_SIMILARITY'])
+    else:
+        query = 'token'
+        row = SheetRow.find_first_by_tokens(list(dict.fromkeys(key.split())))
+    # Labelled with the query that ran, not the configured matcher
+    COMPANY_MATCH_DURATION.labels(f'{query}_db').observe(time.perf_counter() - started)
+    return row.as_sheet_row() if row else None
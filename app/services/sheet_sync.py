@@ -0,0 +1,144 @@
+import threading
+import time
+import zlib
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from app.config import Config
+from app.services import http_client
+from app.services.metrics import SHEET_SYNCS
+from app.utils import logger
+
+# Matching only uses the first five columns (adviser, lead, LinkedIn URL, company, title)
+SHEET_FIRST_COLUMN = 'A'
+SHEET_LAST_COLUMN = 'E'
+SHEET_COLUMN_COUNT = 5
+# Joins the cells of a row before hashing; cannot occur in cell text typed into a sheet
+CELL_SEPARATOR = '\x1f'
+
+
+def _quote_sheet_name(sheet_name: str) -> str:
+    return "'" + sheet_name.replace("'", "''") + "'"
+
+
+def _row_hash(row: list) -> int:
+    cells = [str(cell) for cell in row[:SHEET_COLUMN_COUNT]]
+    # The API leaves out trailing empty cells, so ['a'] and ['a', ''] are the same row
+    cells += [''] * (SHEET_COLUMN_COUNT - len(cells))
+    return zlib.crc32(CELL_SEPARATOR.join(cells).encode('utf-8'))
+
+
+def row_hashes(rows: list) -> np.ndarray:
+    """
+    crc32 of the content of columns A-E of every row; used to spot edited rows without keeping a
+    second copy of the rows.
+    """
+    return np.fromiter((_row_hash(row) for row in rows), dtype=np.uint32, count=len(rows))
+
+
+class SheetSync:
+    """
+    Keeps a copy of the sheet's first columns up to date with range requests.
+
+    A sync of a known sheet first asks for the rows after the last synced one, so appended rows
+    cost only their own bytes. When nothing was appended (the revision changed because of an
+    edit) or every ``edit_check_interval`` seconds, columns A-E are downloaded again and their
+    per-row content hashes are compared with the synced rows. When no row changed, the synced
+    rows are kept as they are, so the caller keeps everything derived from them. A full download
+    also happens on the first sync and every ``full_resync_interval`` seconds.
+    """
+
+    def __init__(self, full_resync_interval: float = 21600, edit_check_interval: float = 600):
+        self.full_resync_interval = full_resync_interval
+        self.edit_check_interval = edit_check_interval
+        self.last_full_sync = 0.0
+        self.last_edit_check = 0.0
+        self._lock = threading.Lock()
+
+    def _values_url(self, api_base_url: str, spreadsheet_id: str, cell_range: str) -> str:
+        return f"{api_base_url}/v4/spreadsheets/{spreadsheet_id}/values/{quote(cell_range, safe='')}"
+
+    def _get_values(self, settings: Tuple[str, str, str, str], cell_range: str) -> Tuple[Optional[list], Optional[str]]:
+        api_base_url, api_key, spreadsheet_id, _ = settings
+        response = http_client.get(self._values_url(api_base_url, spreadsheet_id, cell_range),
+                                   params={"key": api_key, "majorDimension": "ROWS"})
+        if response.status_code != 200:
+            return None, f"Failed to retrieve {cell_range}. Status code: {response.status_code}, Message: {response.text}"
+        return response.json().get("values", []), None
+
+    def _full_sync(self, settings: Tuple[str, str, str, str], now: float) -> Tuple[Optional[list], Optional[str]]:
+        sheet = _quote_sheet_name(settings[3])
+        rows, error = self._get_values(settings, f"{sheet}!{SHEET_FIRST_COLUMN}:{SHEET_LAST_COLUMN}")
+        if error:
+            return None, error
+        self.last_full_sync = self.last_edit_check = now
+        SHEET_SYNCS.labels('full').inc()
+        logger.info("Full sheet sync: %s rows.", len(rows))
+        return rows, None
+
+    def _find_edited_rows(self, settings: Tuple[str, str, str, str], rows: list,
+                          previous_hashes: np.ndarray) -> Tuple[Optional[list], Optional[List[int]], Optional[str]]:
+        """
+        Download columns A-E again and compare the content hash of every row with the synced rows.
+        :return: A tuple of the current rows and the indexes of the synced rows that changed or
+            were removed, or None, None and an error message.
+        """
+        sheet = _quote_sheet_name(settings[3])
+        current, error = self._get_values(settings, f"{sheet}!{SHEET_FIRST_COLUMN}:{SHEET_LAST_COLUMN}")
+        if error:
+            return None, None, error
+        compared = min(len(rows), len(current))
+        edited = np.flatnonzero(row_hashes(current[:compared]) != previous_hashes[:compared]).tolist()
+        return current, edited + list(range(compared, len(rows))), None
+
+    def sync(self, settings: Tuple[str, str, str, str], previous_rows: Optional[list],
+             previous_hashes: Optional[np.ndarray] = None) -> Tuple[Optional[list], Optional[str]]:
+        """
+        Bring the synced rows up to date.
+        :param settings: API base URL, API key, spreadsheet id and sheet name.
+        :param previous_rows: The rows of the last sync, or None.
+        :param previous_hashes: row_hashes(previous_rows), if already computed.
+        :return: A tuple of the current rows or None and an error message or None.
+        """
+        with self._lock:
+            now = time.time()
+            if not previous_rows or now - self.last_full_sync >= self.full_resync_interval:
+                return self._full_sync(settings, now)
+
+            sheet = _quote_sheet_name(settings[3])
+            first_new_row = len(previous_rows) + 1
+            appended, error = self._get_values(
+                settings, f"{sheet}!{SHEET_FIRST_COLUMN}{first_new_row}:{SHEET_LAST_COLUMN}")
+            if error:
+                return None, error
+            if appended:
+                SHEET_SYNCS.labels('append').inc()
+                logger.info("Appended %s sheet rows after row %s.", len(appended), first_new_row - 1)
+                if now - self.last_edit_check < self.edit_check_interval:
+                    return list(previous_rows) + appended, None
+
+            self.last_edit_check = now
+            if previous_hashes is None:
+                previous_hashes = row_hashes(previous_rows)
+            rows, edited, error = self._find_edited_rows(settings, previous_rows, previous_hashes)
+            if error:
+                return None, error
+            if not edited and len(rows) == len(previous_rows) + len(appended):
+                if not appended:
+                    # Same list object: the caller can keep its snapshot and everything derived from it
+                    SHEET_SYNCS.labels('unchanged').inc()
+                    return previous_rows, None
+                return list(previous_rows) + appended, None
+
+            # The edit check downloaded every row, which counts as a full sync
+            self.last_full_sync = now
+            SHEET_SYNCS.labels('edits').inc()
+            logger.info("Found %s edited sheet rows.", len(edited))
+            return rows, None
+
+sheet_sync = SheetSync(
+    full_resync_interval=Config.SHEET_FULL_RESYNC_INTERVAL,
+    edit_check_interval=Config.SHEET_EDIT_CHECK_INTERVAL,
+)
@@ -0,0 +1,123 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from cachetools import TTLCache
+from flask import current_app
+
+from app.config import Config
+from app.database import db
+from app.models import WebhookDelivery
+from app.services.cache import StatsCache
+from app.services.lead_matching import OUTCOME_ERROR
+from app.utils import logger
+
+WEBHOOK_DEDUP_TTL = Config.WEBHOOK_DEDUP_TTL
+
+# (source, delivery id) -> {"result", "status_code"} of finished deliveries; the
+# webhook_deliveries table is the shared record, this only spares it the lookups of hot replays
+delivery_cache = StatsCache(TTLCache(
+    maxsize=Config.WEBHOOK_DEDUP_CACHE_SIZE,
+    ttl=WEBHOOK_DEDUP_TTL,
+), name='webhook_deliveries')
+
+# Expired rows are deleted at most this often per process, by whoever records deliveries
+PURGE_INTERVAL = 3600
+_last_purge = float("-inf")
+_purge_lock = threading.Lock()
+
+
+def hubspot_delivery_id(event: Dict) -> Optional[str]:
+    event_id = event.get('eventId')
+    return str(event_id) if event_id is not None else None
+
+
+def pipedrive_delivery_id(payload: Dict) -> Optional[str]:
+    delivery_id = (payload.get('meta') or {}).get('id')
+    return str(delivery_id) if delivery_id is not None else None
+
+
+def claim_deliveries(source: str, delivery_ids: Iterable[str]) -> Tuple[Set[str], Dict[str, Optional[Dict]]]:
+    """
+    Claims the delivery ids seen for the first time; the others are replays.
+    :return: A tuple of the claimed ids and a delivery id -> recorded {"result", "status_code"}
+        mapping of the replays. The recorded value is None while the first delivery is still
+        being processed.
+    """
+    replays = {}
+    unknown_ids = []
+    for delivery_id in dict.fromkeys(delivery_ids):
+        recorded = delivery_cache.get((source, delivery_id))
+        if recorded is None:
+            unknown_ids.append(delivery_id)
+        else:
+            replays[delivery_id] = recorded
+    if not unknown_ids:
+        return set(), replays
+
+    now = datetime.utcnow()
+    claimed, existing = WebhookDelivery.claim(
+        source, unknown_ids,
+        expires_at=now + timedelta(seconds=WEBHOOK_DEDUP_TTL),
+        stale_before=now - timedelta(seconds=current_app.config['WEBHOOK_VISIBILITY_TIMEOUT']),
+    )
+    for delivery_id in unknown_ids:
+        if delivery_id in claimed:
+            continue
+        delivery = existing.get(delivery_id)
+        if delivery is not None and delivery.status == WebhookDelivery.STATUS_DONE:
+            recorded = {"result": delivery.result, "status_code": delivery.status_code}
+            delivery_cache.set((source, delivery_id), recorded)
+            replays[delivery_id] = recorded
+        else:
+            replays[delivery_id] = None
+    return set(claimed), replays
+
+
+def mark_deliveries_queued(source: str, webhook_event_ids: Dict[str, int]) -> None:
+    if webhook_event_ids:
+        WebhookDelivery.mark_queued(source, webhook_event_ids)
+
+
+def record_deliveries(source: str, results: Dict[str, Tuple[Dict, int]]) -> None:
+    """
+    Stores the outcome of processed deliveries, to be returned for their replays.
+    Deliveries that ended in an error are released instead, so the sender's retry runs again.
+    Expired records are purged on the way, so they are also purged without webhook workers.
+    """
+    failed = [delivery_id for delivery_id, (result, status_code) in results.items()
+              if status_code >= 400 or result.get("outcome") == OUTCOME_ERROR]
+    done = {delivery_id: outcome for delivery_id, outcome in results.items() if delivery_id not in failed}
+    if done:
+        WebhookDelivery.record(source, done)
+        for delivery_id, (result, status_code) in done.items():
+            delivery_cache.set((source, delivery_id), {"result": result, "status_code": status_code})
+    release_deliveries(source, failed)
+    purge_expired_deliveries()
+
+
+def release_deliveries(source: str, delivery_ids: List[str]) -> None:
+    for delivery_id in delivery_ids:
+        delivery_cache.pop((source, delivery_id))
+    WebhookDelivery.release(source, list(delivery_ids))
+
+
+def purge_expired_deliveries() -> None:
+    """
+    Deletes expired delivery records, at most once per PURGE_INTERVAL per process. A failure is
+    logged and retried after the next interval.
+    """
+    global _last_purge
+    if time.monotonic() - _last_purge < PURGE_INTERVAL or not _purge_lock.acquire(blocking=False):
+        return
+    try:
+        _last_purge = time.monotonic()
+        deleted = WebhookDelivery.purge_expired()
+        if deleted:
+            logger.info("Purged %s expired webhook deliveries.", deleted)
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Failed to purge expired webhook deliveries: %s", e)
+    finally:
+        _purge_lock.release()
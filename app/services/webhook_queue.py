@@ -0,0 +1,156 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from flask import Flask, current_app
+
+from app.database import db
+from app.models import WebhookEvent
+from app.services.lead_matching import process_hubspot_events, process_pipedrive_lead, OUTCOME_ERROR
+from app.services.webhook_dedup import (hubspot_delivery_id, pipedrive_delivery_id, purge_expired_deliveries,
+                                        record_deliveries, release_deliveries)
+from app.utils import logger
+
+SOURCE_HUBSPOT = 'hubspot'
+SOURCE_PIPEDRIVE = 'pipedrive'
+SOURCES = (SOURCE_HUBSPOT, SOURCE_PIPEDRIVE)
+
+
+def enqueue_webhook_events(source: str, payloads: List[Dict]) -> List[int]:
+    """
+    Persists raw webhook payloads so they can be processed outside of the request.
+    :return: The ids of the queued events.
+    """
+    events = WebhookEvent.enqueue(source, payloads)
+    logger.info("Queued %s %s webhook events.", len(events), source)
+    return [event.id for event in events]
+
+
+def _finish(event: WebhookEvent, result: Dict) -> None:
+    event.status = WebhookEvent.STATUS_DONE
+    event.result = result
+    event.error = None
+    event.processed_at = datetime.utcnow()
+
+
+def _fail(event: WebhookEvent, error: str, max_attempts: int) -> None:
+    # Retry later unless the event has used up its attempts
+    event.status = WebhookEvent.STATUS_FAILED if event.attempts >= max_attempts else WebhookEvent.STATUS_PENDING
+    event.error = error
+    event.locked_at = None
+
+
+def process_claimed_events(source: str, events: List[WebhookEvent]) -> None:
+    """
+    Runs the matching pipeline for claimed events and records their results.
+    HubSpot events are processed as one batch so they share the batch API calls.
+    """
+    max_attempts = current_app.config['WEBHOOK_MAX_ATTEMPTS']
+    status_codes = {}
+    if source == SOURCE_HUBSPOT:
+        results, error = process_hubspot_events([event.payload for event in events])
+        for index, event in enumerate(events):
+            if error:
+                _fail(event, error, max_attempts)
+            else:
+                _finish(event, results[index])
+                status_codes[event.id] = 200
+    else:
+        for event in events:
+            try:
+                result, status_code = process_pipedrive_lead(event.payload)
+            except Exception as e:
+                db.session.rollback()
+                logger.error("Error processing %s event %s: %s", source, event.id, e, exc_info=True)
+                _fail(event, str(e), max_attempts)
+                continue
+            # Upstream failures (organization or sheet fetch) are retried, bad payloads are not
+            if result["outcome"] == OUTCOME_ERROR and status_code >= 500:
+                _fail(event, result["message"], max_attempts)
+            else:
+                _finish(event, result)
+                status_codes[event.id] = status_code
+    db.session.commit()
+    _settle_deliveries(source, events, status_codes)
+
+
+def _settle_deliveries(source: str, events: List[WebhookEvent], status_codes: Dict[int, int]) -> None:
+    # Finished events answer later replays of their delivery; events that gave up are forgotten
+    # so that a new delivery is processed again
+    delivery_id = hubspot_delivery_id if source == SOURCE_HUBSPOT else pipedrive_delivery_id
+    done, failed = {}, []
+    for event in events:
+        event_delivery_id = delivery_id(event.payload)
+        if event_delivery_id is None:
+            continue
+        if event.status == WebhookEvent.STATUS_DONE:
+            done[event_delivery_id] = (event.result, status_codes[event.id])
+        elif event.status == WebhookEvent.STATUS_FAILED:
+            failed.append(event_delivery_id)
+    record_deliveries(source, done)
+    release_deliveries(source, failed)
+
+
+def drain_once(source: str, batch_size: int) -> int:
+    """
+    Claims and processes one batch of events of the given source.
+    :return: The number of events processed.
+    """
+    max_attempts = current_app.config['WEBHOOK_MAX_ATTEMPTS']
+    stale_before = datetime.utcnow() - timedelta(seconds=current_app.config['WEBHOOK_VISIBILITY_TIMEOUT'])
+    events = WebhookEvent.claim(source, batch_size, stale_before, max_attempts)
+    if not events:
+        return 0
+    try:
+        process_claimed_events(source, events)
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error processing %s events: %s", source, e, exc_info=True)
+        # Retry the batch later, or give up on the events that have used up their attempts
+        for event in events:
+            _fail(event, str(e), max_attempts)
+        db.session.commit()
+        _settle_deliveries(source, events, {})
+    return len(events)
+
+
+def _worker_loop(app: Flask, batch_size: int, poll_interval: float, stop_event: threading.Event) -> None:
+    while not stop_event.is_set():
+        processed = 0
+        with app.app_context():
+            for source in SOURCES:
+                try:
+                    processed += drain_once(source, batch_size)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error("Webhook worker error: %s", e, exc_info=True)
+            db.session.remove()
+        if not processed:
+            with app.app_context():
+                purge_expired_deliveries()
+                db.session.remove()
+            stop_event.wait(poll_interval)
+
+
+def run_webhook_workers(app: Flask, threads: int, batch_size: int, poll_interval: float) -> None:
+    """
+    Runs a pool of worker threads draining the webhook queue until interrupted.
+    """
+    stop_event = threading.Event()
+    workers = [
+        threading.Thread(target=_worker_loop, args=(app, batch_size, poll_interval, stop_event),
+                         name=f"webhook-worker-{index}", daemon=True)
+        for index in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info("Started %s webhook workers.", threads)
+    try:
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("Stopping webhook workers...")
+        stop_event.set()
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,103 @@
+import importlib.machinery
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+# Imports listed in the startup summary
+SLOWEST_IMPORTS = 10
+
+
+# Loaders created for every module found on sys.path; only these are timed
+TIMED_LOADERS = (importlib.machinery.SourceFileLoader, importlib.machinery.SourcelessFileLoader,
+                 importlib.machinery.ExtensionFileLoader)
+
+
+class ImportTimer:
+    """
+    Times every module imported from a file while started, like ``python -X importtime``.
+    Sits first on sys.meta_path, lets the other finders find each module and wraps its loader;
+    builtin and frozen modules are not timed.
+    """
+
+    def __init__(self):
+        # (module name, cumulative seconds, nesting depth), in completion order
+        self.timings: List[Tuple[str, float, int]] = []
+        self._local = threading.local()
+
+    def start(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def stop(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, 'find_spec', None)
+            if finder is self or find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if not isinstance(spec.loader, TIMED_LOADERS):
+            return spec
+        exec_module = spec.loader.exec_module
+
+        def timed_exec_module(module) -> None:
+            depth = getattr(self._local, 'depth', 0)
+            self._local.depth = depth + 1
+            started = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                self._local.depth = depth
+                self.timings.append((fullname, time.perf_counter() - started, depth))
+
+        spec.loader.exec_module = timed_exec_module
+        return spec
+
+
+class StartupReport:
+    """
+    Durations of the import and initialization steps of create_app, to track cold-start time,
+    and of the modules imported meanwhile when an ImportTimer ran.
+    """
+
+    def __init__(self):
+        self.timings: List[Tuple[str, float]] = []
+        self.imports: List[Tuple[str, float, int]] = []
+
+    def record(self, name: str, seconds: float) -> None:
+        self.timings.append((name, seconds))
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    @property
+    def total(self) -> float:
+        return sum(seconds for _, seconds in self.timings)
+
+    def slowest_imports(self, count: int = SLOWEST_IMPORTS) -> List[Tuple[str, float]]:
+        """
+        The outermost imports, with the time spent in the modules they pulled in, slowest first.
+        """
+        outermost = [(name, seconds) for name, seconds, depth in self.imports if depth == 0]
+        return sorted(outermost, key=lambda timing: timing[1], reverse=True)[:count]
+
+    def summary(self) -> str:
+        steps = ', '.join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.timings)
+        summary = f"Startup took {self.total * 1000:.1f} ms: {steps}"
+        if self.imports:
+            imports = ', '.join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.slowest_imports())
+            summary += f". Slowest imports: {imports}"
+        return summary
@@ -0,0 +1,25 @@
+from typing import Callable, Dict
+
+from flask import Flask
+
+
+def swag_from(specs: Dict) -> Callable:
+    """
+    Attach a Swagger spec dictionary to a view, as flasgger.swag_from does, without importing
+    flasgger: Swagger reads function.specs_dict when it builds the API spec.
+    """
+    def decorator(function: Callable) -> Callable:
+        function.specs_dict = specs
+        return function
+    return decorator
+
+
+def init_swagger(app: Flask) -> None:
+    """
+    Serve the API documentation under /apidocs when SWAGGER_ENABLED is set; flasgger is only
+    imported then.
+    """
+    if not app.config['SWAGGER_ENABLED']:
+        return
+    from flasgger import Swagger
+    Swagger(app)
@@ -2,125 +2,195 @@ import requests
 from flask import current_app, jsonify
 import time
 import urllib.parse
+from app.config import Config
+from app.database import db
 from app.models import AccessToken
-from datetime import datetime, timedelta
+from app.services import http_client
+from app.services.log_pipeline import configure_logging, parse_sample_rates
+from app.services.metrics import CACHE_ENTRIES, CACHE_LOOKUPS
 from typing import Optional, Dict, Tuple, Any
 import logging
 import re
+import threading
+from functools import lru_cache
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[logging.StreamHandler()]
+configure_logging(
+    level=Config.LOG_LEVEL,
+    log_format=Config.LOG_FORMAT,
+    queue_size=Config.LOG_QUEUE_SIZE,
+    sample_rates=parse_sample_rates(Config.LOG_SAMPLE_RATES),
 )
 logger = logging.getLogger(__name__)
 
+HUBSPOT_API_BASE_URL = Config.HUBSPOT_API_BASE_URL
+
 
 def make_hubspot_api_request(url: str, headers: Optional[Dict[str, str]] = None,
-                             params: Optional[Dict[str, str]] = None) -> Tuple[Optional[Dict], Optional[str]]:
+                             params: Optional[Dict[str, str]] = None, method: str = "GET",
+                             json: Optional[Dict] = None) -> Tuple[Optional[Dict], Optional[str]]:
     """
-    Make a GET request to the HubSpot API, automatically handling token refresh if unauthorized (401).
+    Make a request to the HubSpot API, automatically handling token refresh if unauthorized (401).
+    Batch endpoints answer 207 when some inputs failed; that is treated as a success.
     :return: A tuple of the response JSON data or None and an error message or None.
     """
     try:
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 401:
+        response = http_client.request(method, url, headers=headers, params=params, json=json)
+        if response.status_code == 401 and headers:
             logger.warning("Unauthorized token, refreshing token...")
-            AccessToken.delete_all_tokens()
-            refresh_hubspot_token()
-            time.sleep(10)
-            new_token = AccessToken.get_token()
+            stale_token = headers.get("Authorization", "").replace("Bearer ", "", 1)
+            new_token = refresh_hubspot_token(stale_access_token=stale_token)
             if new_token:
-                headers["Authorization"] = f"Bearer {new_token.access_token}"
-                response = requests.get(url, headers=headers, params=params)
-        if response.status_code != 200:
-            logger.error(f"Failed request with status code: {response.status_code}")
+                headers["Authorization"] = f"Bearer {new_token}"
+                response = http_client.request(method, url, headers=headers, params=params, json=json)
+        if response.status_code not in (200, 207):
+            logger.error("Failed request with status code: %s", response.status_code)
             return None, response.text
-        logger.info(f"Request successful for URL: {url}")
+        logger.info("Request successful for URL: %s", url)
         return response.json(), None
     except requests.exceptions.RequestException as e:
-        logger.error(f"Request error: {e}")
+        logger.error("Request error: %s", e)
         return None, f"Request failed: {str(e)}"
 
 
-def refresh_hubspot_token() -> None:
+# Serializes refreshes within the process; the access_tokens row lock serializes them across processes
+_token_refresh_lock = threading.Lock()
+_background_refresh_running = threading.Event()
+
+
+def refresh_hubspot_token(stale_access_token: Optional[str] = None) -> Optional[str]:
     """
-    Refreshes the HubSpot OAuth token by triggering the authorization flow.
+    Refreshes the HubSpot OAuth token with the refresh_token grant.
+    Concurrent callers wait for the refresh in flight instead of starting their own: once the
+    lock is acquired, a token that is no longer stale (refreshed by another thread or worker)
+    is returned as is.
+    :return: The valid access token or None if it could not be refreshed.
     """
+    margin = current_app.config['HUBSPOT_TOKEN_REFRESH_MARGIN']
+    with _token_refresh_lock:
+        try:
+            token = AccessToken.get_token_for_update()
+            if not token:
+                logger.error("No HubSpot token stored. To get an access token,"
+                             " click on this link: %s/hubspot/auth", current_app.config['BASE_URL'])
+                return None
+            refreshed_elsewhere = stale_access_token and token.access_token != stale_access_token
+            if refreshed_elsewhere or (not stale_access_token and token.expiration_time - time.time() > margin):
+                access_token = token.access_token
+                db.session.commit()
+                return access_token
+            if not token.refresh_token:
+                db.session.rollback()
+                logger.error("No HubSpot refresh token stored. To get a fresh access token,"
+                             " click on this link: %s/hubspot/auth", current_app.config['BASE_URL'])
+                return None
+
+            data = {
+                'grant_type': 'refresh_token',
+                'client_id': current_app.config['CLIENT_ID'],
+                'client_secret': current_app.config['CLIENT_SECRET'],
+                'redirect_uri': current_app.config['REDIRECT_URI'],
+                'refresh_token': token.refresh_token,
+            }
+            response = http_client.post(current_app.config['HUBSPOT_TOKEN_URL'], data=data)
+            response.raise_for_status()
+            response_data = response.json()
+            token.access_token = response_data['access_token']
+            token.expiration_time = time.time() + response_data.get('expires_in', 3600)
+            token.refresh_token = response_data.get('refresh_token', token.refresh_token)
+            access_token = token.access_token
+            db.session.commit()
+            logger.info("Successfully refreshed HubSpot token. Expiration time: %s", token.expiration_time)
+            return access_token
+        except requests.exceptions.RequestException as e:
+            db.session.rollback()
+            logger.error("Error refreshing HubSpot token: %s", e)
+            logger.error("Invalid or expired token. To get a fresh access token,"
+                         " click on this link: %s/hubspot/auth", current_app.config['BASE_URL'])
+            return None
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            # Whatever happened, the next reader must see the token as stored now
+            AccessToken.invalidate_cache()
+
+
+def _refresh_hubspot_token_in_background(app) -> None:
     try:
-        auth_url = f"{current_app.config['BASE_URL']}hubspot/auth"
-        response = requests.get(auth_url, allow_redirects=True)
-        if response.history:
-            logger.info(f"Redirected {len(response.history)} times")
-            final_redirect_url = response.url
-            logger.info(f"Final destination: {final_redirect_url}")
-            final_response = requests.get(final_redirect_url)
-            if final_response.status_code == 200:
-                logger.info("Successfully refreshed HubSpot token after final redirect.")
-            else:
-                logger.error(f"Failed to refresh HubSpot token at final URL: {final_response.status_code}")
-        else:
-            logger.info("No redirects occurred.")
-            if response.status_code == 200:
-                logger.info("Successfully refreshed HubSpot token.")
-            else:
-                logger.error(f"Failed to refresh HubSpot token: {response.status_code}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error refreshing HubSpot token: {e}")
-        logger.error("Invalid or expired token. To get a fresh access token,"
-                     f" click on this link: {current_app.config['BASE_URL']}/hubspot/auth")
+        with app.app_context():
+            refresh_hubspot_token()
+            db.session.remove()
+    except Exception as e:
+        logger.error("Background HubSpot token refresh failed: %s", e)
+    finally:
+        _background_refresh_running.clear()
+
+
+def get_hubspot_access_token() -> Optional[str]:
+    """
+    Returns a usable HubSpot access token, driven by AccessToken.expiration_time.
+    A token inside the refresh margin is still returned while a background thread refreshes it;
+    an expired token is refreshed before returning.
+    """
+    token = AccessToken.get_cached_token()
+    if not token:
+        return None
+    remaining = token.expiration_time - time.time()
+    if remaining <= 0:
+        return refresh_hubspot_token()
+    if remaining <= current_app.config['HUBSPOT_TOKEN_REFRESH_MARGIN'] and not _background_refresh_running.is_set():
+        _background_refresh_running.set()
+        threading.Thread(
+            target=_refresh_hubspot_token_in_background,
+            args=(current_app._get_current_object(),),
+            name="hubspot-token-refresh",
+            daemon=True,
+        ).start()
+    return token.access_token
+
+
+def get_hubspot_auth_headers() -> Dict[str, str]:
+    access_token = get_hubspot_access_token()
+    return {"Authorization": f"Bearer {access_token or ''}"}
 
 
 def get_hubspot_company_details(contact_id: str) -> Tuple[Optional[Dict], Optional[str]]:
     """
-    Retrieves the company details associated with a HubSpot contact.
+    Retrieves the company details associated with a HubSpot contact, through the same caches
+    as the batch lookups.
     :return: A tuple containing the company details or None and an error message or None.
     """
+    # app.services.hubspot builds on this module
+    from app.services.hubspot import batch_read_companies, batch_read_contact_companies
     try:
-        url = f"https://api.hubapi.com/crm/v3/objects/contacts/{contact_id}/associations/companies"
-        token = AccessToken.get_token()
-        headers = {"Authorization": f"Bearer {token.access_token}"} if token else {"Authorization": "Bearer "}
-        response_data, error = make_hubspot_api_request(url, headers)
+        contact_companies, error = batch_read_contact_companies([str(contact_id)])
         if error:
-            logger.error(f"Error retrieving company details: {error}")
+            logger.error("Error retrieving company details: %s", error)
             return None, error
-        if response_data.get("results"):
-            company_id = response_data["results"][0].get("id")
-            if company_id:
-                url = f"https://api.hubapi.com/crm/v3/objects/companies/{company_id}"
-                response_data, error = make_hubspot_api_request(url, headers)
-                if error:
-                    logger.error(f"Error retrieving company info: {error}")
-                    return None, error
-                logger.info(f"Successfully retrieved company details for contact {contact_id}.")
-                return response_data, None
-        logger.warning(f"No company associated with contact {contact_id}")
+        company_id = contact_companies.get(str(contact_id))
+        if company_id:
+            companies, error = batch_read_companies([company_id])
+            if error:
+                logger.error("Error retrieving company info: %s", error)
+                return None, error
+            if company_id in companies:
+                logger.info("Successfully retrieved company details for contact %s.", contact_id)
+                return {"id": company_id, "properties": companies[company_id]}, None
+        logger.warning("No company associated with contact %s", contact_id)
         return None, "No company associated"
     except Exception as e:
-        logger.error(f"Error in get_hubspot_company_details: {e}")
+        logger.error("Error in get_hubspot_company_details: %s", e)
         return None, f"Error: {str(e)}"
 
 
 def get_google_sheet_data() -> Tuple[Optional[list], Optional[str]]:
     """
     Retrieves data from a specified Google Sheet.
+    Served from the shared sheet snapshot cache, see app.services.google_sheets.
     :return: A tuple containing the sheet data as a list or None and an error message or None.
     """
-    try:
-        google_sheets_api_key = current_app.config['GOOGLE_SHEETS_API_KEY']
-        spreadsheet_id = current_app.config['SPREADSHEET_ID']
-        spreadsheet_sheet_name = current_app.config['SPREADSHEET_SHEET_NAME']
-        url = f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}/values/{spreadsheet_sheet_name}?key={google_sheets_api_key}"
-        response_data, error = make_hubspot_api_request(url)
-        if error:
-            logger.error(f"Error retrieving Google Sheet data: {error}")
-            return None, error
-
-        logger.info("Successfully retrieved data from Google Sheet.")
-        return response_data.get("values", []), None
-    except Exception as e:
-        logger.error(f"Error in get_google_sheet_data: {e}")
-        return None, f"Error: {str(e)}"
+    from app.services.google_sheets import get_google_sheet_data as get_cached_google_sheet_data
+    return get_cached_google_sheet_data()
 
 
 def get_hubspot_oauth_url(user_id: str, client_id: str, redirect_uri: str, scope: str) -> str:
@@ -154,24 +224,24 @@ def exchange_authorization_code_and_save(code: str) -> Dict[str, str]:
     }
 
     try:
-        response = requests.post(token_url, data=data)
+        response = http_client.post(token_url, data=data)
         response.raise_for_status()
         response_data = response.json()
         access_token = response_data.get('access_token')
         expires_in = response_data.get('expires_in', 3600)
-        expiration_time = (datetime.utcnow() + timedelta(seconds=expires_in)).timestamp()
-        AccessToken.save_token(access_token, expiration_time)
-        logger.info(f"Access token saved successfully. Expiration time: {expiration_time}")
+        expiration_time = time.time() + expires_in
+        AccessToken.save_token(access_token, expiration_time, response_data.get('refresh_token'))
+        logger.info("Access token saved successfully. Expiration time: %s", expiration_time)
         return {
             "access_token": access_token,
             "expires_in": expires_in,
             "expiration_time": expiration_time
         }
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error exchanging authorization code: {e}")
+        logger.error("Error exchanging authorization code: %s", e)
         return {"error": f"HTTP request failed: {str(e)}"}
     except Exception as e:
-        logger.error(f"Unexpected error during token exchange: {e}")
+        logger.error("Unexpected error during token exchange: %s", e)
         return {"error": f"Unexpected error: {str(e)}"}
 
 
@@ -191,19 +261,73 @@ def create_response(message: Optional[str] = None, data: Optional[Dict] = None,
     return jsonify(response), status_code
 
 
+# Common company suffixes and abbreviations removed by normalize_name
+COMPANY_NAME_SUFFIXES = frozenset({
+    'the', 'llc', 'ltd', 'inc', 'corp', 'company', 'co', 'plc', 'group', 'enterprises', 'services', 'associates',
+    'international', 'solutions', 'consulting', 'industries', 'partners', 'studios', 'technologies', 'manufacturers',
+})
+# Two-word suffixes, removed only when their words are separated by a single space
+COMPANY_NAME_SUFFIX_PAIRS = frozenset({('pvt', 'ltd'), ('private', 'limited')})
+_WORD_SPLIT_RE = re.compile(r'(\w+)')
+
+
+@lru_cache(maxsize=Config.NORMALIZE_CACHE_SIZE)
 def normalize_name(name: str) -> str:
     """
     Normalize company names by removing suffixes and converting to lowercase.
     Removes abbreviations like Pvt Ltd, Inc, Corp, Company, etc.
+    Words are tokenized in a single pass and looked up in a set, and results are memoized;
+    use normalize_name.cache_info() for hit/miss counters.
+    """
+    # Alternating separator / word pieces: ['', 'acme', ' ', 'inc', '']
+    pieces = _WORD_SPLIT_RE.split(name.lower())
+    kept = []
+    i = 1
+    while i < len(pieces):
+        word = pieces[i]
+        if i + 2 < len(pieces) and pieces[i + 1] == ' ' and (word, pieces[i + 2]) in COMPANY_NAME_SUFFIX_PAIRS:
+            kept.append(pieces[i - 1])
+            i += 4
+            continue
+        kept.append(pieces[i - 1])
+        if word not in COMPANY_NAME_SUFFIXES:
+            kept.append(word)
+        i += 2
+    kept.append(pieces[i - 1])
+    # Collapse the whitespace left after removing the suffixes
+    return ' '.join(''.join(kept).split())
+
+
+def normalize_cache_info() -> Dict[str, int]:
+    """
+    Expose the normalize_name memoization statistics.
+    """
+    info = normalize_name.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
+# normalize_name hits and misses already added to cache_lookups_total by this process
+_normalize_cache_reported = {"hits": 0, "misses": 0}
+_normalize_cache_reported_lock = threading.Lock()
+
+
+def record_normalize_cache_metrics() -> None:
+    """
+    Add the normalize_name cache hits and misses since the last call to cache_lookups_total and
+    set its size in cache_entries. lru_cache only keeps counters, so they are reported as deltas.
     """
-    name = name.lower()
-    # List of common company suffixes and abbreviations to remove
-    suffixes = r'\b(the|pvt ltd|private limited|llc|ltd|inc|corp|company|co|plc|group|enterprises|services|associates|international|solutions|consulting|industries|partners|studios|technologies|manufacturers)\b'
-    # Remove the suffixes and extra spaces
-    name = re.sub(suffixes, '', name)
-    # Remove any extra spaces left after removing the suffixes
-    name = re.sub(r'\s+', ' ', name).strip()
-    return name
+    info = normalize_cache_info()
+    with _normalize_cache_reported_lock:
+        reported = _normalize_cache_reported
+        # cache_clear() resets both counters, so either one going down means they restarted from zero
+        cleared = info["hits"] < reported["hits"] or info["misses"] < reported["misses"]
+        deltas = {name: info[name] if cleared else info[name] - reported[name] for name in reported}
+        reported.update(hits=info["hits"], misses=info["misses"])
+    if deltas["hits"]:
+        CACHE_LOOKUPS.labels('normalize_name', 'hit').inc(deltas["hits"])
+    if deltas["misses"]:
+        CACHE_LOOKUPS.labels('normalize_name', 'miss').inc(deltas["misses"])
+    CACHE_ENTRIES.labels('normalize_name').set(info["size"])
 
 
 def match_company_name(name_in_hubspot: str, name_in_sheet: str) -> bool:
@@ -1,17 +1,37 @@
+from typing import Dict, Optional
+
 from flask import Blueprint, request, redirect, current_app
-from app.models import Lead
-from flasgger import swag_from
+from app.swagger import swag_from
 from app.swagger_docs import hubspot
+from app.services.google_sheets import process_drive_notification
+from app.services.lead_matching import process_hubspot_events, OUTCOME_IN_PROGRESS, OUTCOME_SAVED
+from app.services.webhook_dedup import (claim_deliveries, hubspot_delivery_id, mark_deliveries_queued,
+                                        record_deliveries, release_deliveries)
+from app.services.webhook_queue import enqueue_webhook_events, SOURCE_HUBSPOT
 from app.utils import *
 
 webhook_bp = Blueprint('webhook', __name__)
 
 
+def replayed_result(event: Dict, recorded: Optional[Dict]) -> Dict:
+    """
+    Result reported for an event HubSpot delivered before: its recorded result, or a notice that
+    the first delivery is still being processed.
+    """
+    if recorded is None:
+        return {"eventId": event.get("eventId"), "objectId": event.get("objectId"), "outcome": OUTCOME_IN_PROGRESS,
+                "message": "Already received, still being processed", "replayed": True}
+    return dict(recorded["result"], replayed=True)
+
+
 @webhook_bp.route('/webhook', methods=['POST'])
 def webhook_handler():
     """
     Handles incoming webhook events, fetches company details from HubSpot,
     and compares them with data in Google Sheets to create leads.
+    HubSpot delivers up to 100 events per request; every event is processed and reported.
+    Company property-change and association-change events invalidate the cached HubSpot data.
+    When WEBHOOK_ASYNC is enabled the events are only queued and the worker pool processes them.
     """
     try:
         data = request.get_json()
@@ -19,52 +39,90 @@ def webhook_handler():
             logger.error("No data received in webhook request.")
             return create_response(message="No data received", status_code=400)
 
-        contact_id = data[0].get('objectId')
-        if not contact_id:
+        events = data if isinstance(data, list) else [data]
+        # Association change events identify their objects with fromObjectId / toObjectId
+        events = [event for event in events if event.get('objectId') or event.get('fromObjectId')]
+        if not events:
             logger.error("No objectId found in webhook data.")
             return create_response(message="No objectId found in webhook data", status_code=400)
 
-        # Fetch company details from HubSpot
-        company_details, error = get_hubspot_company_details(contact_id)
-        if error:
-            logger.error(f"Failed to fetch company details for contact {contact_id}: {error}")
-            return create_response(message="Failed to fetch company details", data={"details": error}, status_code=500)
-
-        company_name = company_details["properties"].get("name", "N/A").lower()
-        domain = company_details["properties"].get("domain", "N/A")
-
-        # Fetch data from Google Sheets
-        sheet_data, error = get_google_sheet_data()
+        # Events HubSpot delivers again (retries after a timeout) are answered from the recorded outcome
+        claimed, replays = claim_deliveries(SOURCE_HUBSPOT, filter(None, map(hubspot_delivery_id, events)))
+        new_events = []
+        repeated_events = []
+        for event in events:
+            delivery_id = hubspot_delivery_id(event)
+            if delivery_id is None or delivery_id in claimed:
+                new_events.append(event)
+                claimed.discard(delivery_id)
+            elif delivery_id not in replays:
+                # Repeated within this batch: answered as a replay of its first copy
+                repeated_events.append(event)
+        replayed_results = [
+            replayed_result(event, replays[hubspot_delivery_id(event)])
+            for event in events if hubspot_delivery_id(event) in replays
+        ]
+        new_delivery_ids = [hubspot_delivery_id(event) for event in new_events]
+
+        if not new_events:
+            in_progress = any(replays[delivery_id] is None for delivery_id in replays)
+            return create_response(message=f"Replayed {len(replayed_results)} already received events.",
+                                   data={"results": replayed_results}, status_code=202 if in_progress else 200)
+
+        if current_app.config['WEBHOOK_ASYNC']:
+            try:
+                event_ids = enqueue_webhook_events(SOURCE_HUBSPOT, new_events)
+            except Exception:
+                release_deliveries(SOURCE_HUBSPOT, list(filter(None, new_delivery_ids)))
+                raise
+            mark_deliveries_queued(SOURCE_HUBSPOT, {
+                delivery_id: event_id for delivery_id, event_id in zip(new_delivery_ids, event_ids) if delivery_id
+            })
+            replayed_results += [replayed_result(event, None) for event in repeated_events]
+            return create_response(message=f"Queued {len(event_ids)} events.",
+                                   data={"event_ids": event_ids, "replayed": replayed_results}, status_code=202)
+
+        try:
+            results, error = process_hubspot_events(new_events)
+        except Exception:
+            release_deliveries(SOURCE_HUBSPOT, list(filter(None, new_delivery_ids)))
+            raise
         if error:
-            logger.error(f"Failed to fetch data from Google Sheets: {error}")
-            return create_response(message="Failed to fetch data from Google Sheets", data={"details": error},
+            release_deliveries(SOURCE_HUBSPOT, list(filter(None, new_delivery_ids)))
+            return create_response(message="Failed to process webhook events", data={"details": error},
                                    status_code=500)
+        results_by_delivery = {
+            delivery_id: result for delivery_id, result in zip(new_delivery_ids, results) if delivery_id
+        }
+        record_deliveries(SOURCE_HUBSPOT, {
+            delivery_id: (result, 200) for delivery_id, result in results_by_delivery.items()
+        })
+        replayed_results += [dict(results_by_delivery[hubspot_delivery_id(event)], replayed=True)
+                             for event in repeated_events]
+
+        saved = sum(1 for result in results if result["outcome"] == OUTCOME_SAVED)
+        logger.info("Processed %s webhook events, %s leads saved.", len(results), saved)
+        return create_response(message=f"Processed {len(results)} events, {saved} leads saved.",
+                               data={"results": results + replayed_results}, status_code=200)
+
+    except Exception as e:
+        logger.error("Error in webhook handler: %s", e)
+        return create_response(message="An error occurred", data={"details": str(e)}, status_code=500)
 
-        # Compare with Google Sheets and save lead if matched
-        for row in sheet_data:
-            company_name_in_sheet = row[3].lower() if row[3] else ""
-            if match_company_name(name_in_hubspot=company_name, name_in_sheet=company_name_in_sheet):
-                # if company_name == company_name_in_sheet:
-                if Lead.query.filter_by(company_name=company_name).first():
-                    logger.info(f"Skipping: Company '{company_name}' already exists in the database.")
-                else:
-                    Lead.create_and_save(
-                        adviser_name=row[0],
-                        lead_name=row[1],
-                        linkedin_url=row[2],
-                        lead_title=row[4],
-                        company_name=row[3],
-                        domain=domain
-                    )
-                    logger.info(f"Lead for '{ row[3]}' has been saved to the database.")
-                    return create_response(message=f"Lead for '{company_name}' has been saved to the database.",
-                                           status_code=200)
-
-        logger.info("No matched company found in Google Sheets.")
-        return create_response(message="No matched company found in Google Sheets.", status_code=200)
 
+@webhook_bp.route('/webhook/google-drive', methods=['POST'])
+def google_drive_notification():
+    """
+    Receives Google Drive change notifications for the spreadsheet (the X-Goog-* headers of a
+    files.watch channel, whose token must match DRIVE_CHANNEL_TOKEN) and invalidates the cached
+    sheet snapshot in every worker, so new rows are seen without waiting for SHEET_CACHE_TTL.
+    """
+    try:
+        result, status_code = process_drive_notification(request.headers)
+        return create_response(message=result["message"], data={"outcome": result["outcome"]},
+                               status_code=status_code)
     except Exception as e:
-        logger.error(f"Error in webhook handler: {e}")
+        logger.error("Error in Drive notification handler: %s", e)
         return create_response(message="An error occurred", data={"details": str(e)}, status_code=500)
 
 
@@ -90,7 +148,7 @@ def authorize_and_exchange():
         return redirect(auth_url)
 
     except Exception as e:
-        logger.error(f"Error in HubSpot authorization: {e}")
+        logger.error("Error in HubSpot authorization: %s", e)
         return create_response(message="Failed to generate authorization URL", data={"details": str(e)},
                                status_code=500)
 
@@ -111,14 +169,13 @@ def callback():
         result = exchange_authorization_code_and_save(code)
 
         if "error" in result:
-            logger.error(f"Error during token exchange: {result['error']}")
+            logger.error("Error during token exchange: %s", result['error'])
             return create_response(message="Error during token exchange", data={"details": result["error"]},
                                    status_code=500)
 
-        logger.info(f"Authorization successful for user, access token generated.")
+        logger.info("Authorization successful for user, access token generated.")
         logger.info("Authorization successful. Details:")
-        logger.info(f"Access Token: {result['access_token']}")
-        logger.info(f"Expires In: {result['expires_in']}")
+        logger.info("Expires In: %s", result['expires_in'])
         logger.info("hubspot authorization successful")
         logger.info("closing the mini window")
         # Add a script to close the mini window and notify the parent
@@ -131,7 +188,7 @@ def callback():
         """
 
     except Exception as e:
-        logger.error(f"Error in callback handling: {e}")
+        logger.error("Error in callback handling: %s", e)
         return create_response(
             message="Error during OAuth callback",
             data={"details": str(e)},
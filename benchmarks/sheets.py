@@ -0,0 +1,44 @@
+import random
+from typing import List, Optional
+
+ADJECTIVES = ["Blue", "Bright", "Global", "Green", "Northern", "Prime", "Rapid", "Silver", "Summit", "United"]
+NOUNS = ["Analytics", "Bakery", "Capital", "Dynamics", "Foods", "Health", "Logistics", "Media", "Robotics", "Systems"]
+SUFFIXES = ["", " Inc", " Ltd", " LLC", " Pvt Ltd", " Corporation", " Group"]
+TITLES = ["CEO", "CTO", "Head of Sales", "VP Marketing", "Founder"]
+
+
+def company_name(index: int, suffix: Optional[str] = None) -> str:
+    """
+    A deterministic, unique company name; the numeric word keeps names distinct at any sheet size.
+    """
+    if suffix is None:
+        suffix = SUFFIXES[index % len(SUFFIXES)]
+    return f"{ADJECTIVES[index % len(ADJECTIVES)]} {NOUNS[index // len(ADJECTIVES) % len(NOUNS)]} W{index}{suffix}"
+
+
+def generate_sheet(rows: int, seed: int = 0) -> List[List[str]]:
+    """
+    Synthetic sheet in the layout the app expects: adviser, lead, LinkedIn URL, company, title.
+    """
+    rng = random.Random(seed)
+    return [
+        [f"Adviser {rng.randrange(50)}", f"Lead {index}", f"https://www.linkedin.com/in/lead-{index}",
+         company_name(index), rng.choice(TITLES)]
+        for index in range(rows)
+    ]
+
+
+def generate_crm_companies(count: int, sheet_rows: int, match_ratio: float, seed: int = 1) -> List[str]:
+    """
+    Company names as the CRM would report them: a match_ratio share refers to sheet rows
+    (with a different legal suffix and casing), the rest match nothing in the sheet.
+    """
+    rng = random.Random(seed)
+    companies = []
+    for index in range(count):
+        if sheet_rows and rng.random() < match_ratio:
+            name = company_name(rng.randrange(sheet_rows), suffix=rng.choice(SUFFIXES))
+            companies.append(name.upper() if rng.random() < 0.2 else name)
+        else:
+            companies.append(f"Unlisted Ventures X{index}")
+    return companies
@@ -0,0 +1,253 @@
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from benchmarks.sheets import generate_crm_companies, generate_sheet
+
+UPSTREAMS = ("hubspot", "pipedrive", "google")
+
+DEFAULT_SETTINGS = {
+    "latency_ms": 50.0,         # mean latency of API calls; each call draws from +/-50% of it
+    "sheet_latency_ms": 200.0,  # latency of the sheet download
+    "unauthorized_rate": 0.0,   # share of authenticated calls answered with 401
+    "rate_limit_rate": 0.0,     # share of calls answered with 429
+    "sheet_rows": 10000,
+    "crm_companies": 5000,
+    "match_ratio": 0.5,
+    "seed": 0,
+}
+# Cell range of a values request, e.g. A:E, A101:E or D1:D500
+A1_RANGE_RE = re.compile(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+class FakeUpstreams:
+    """
+    Canned responses for the HubSpot, Pipedrive and Google endpoints the app calls.
+
+    CRM companies are numbered; HubSpot contact N and Pipedrive organization N both belong to
+    company N modulo the number of companies, so the same ids always resolve to the same names.
+    """
+
+    def __init__(self, settings: Dict):
+        self.settings = dict(DEFAULT_SETTINGS, **settings)
+        self.companies = generate_crm_companies(self.settings["crm_companies"], self.settings["sheet_rows"],
+                                                self.settings["match_ratio"], seed=self.settings["seed"] + 1)
+        self.sheet_rows = ([["Adviser", "Lead", "LinkedIn", "Company", "Title"]]
+                           + generate_sheet(self.settings["sheet_rows"], seed=self.settings["seed"]))
+        self.sheet_body = json.dumps({"values": self.sheet_rows}).encode()
+        self.counts: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.tokens_issued = 0
+        self.routes = [
+            ("POST", re.compile(r"/crm/v4/associations/contacts/companies/batch/read$"), self.hubspot_associations),
+            ("POST", re.compile(r"/crm/v3/objects/companies/batch/read$"), self.hubspot_companies),
+            ("GET", re.compile(r"/crm/v3/objects/contacts/(\d+)/associations/companies$"),
+             self.hubspot_contact_companies),
+            ("GET", re.compile(r"/crm/v3/objects/companies/(\d+)$"), self.hubspot_company),
+            ("GET", re.compile(r"/crm/v3/objects/contacts$"), self.hubspot_contacts),
+            ("POST", re.compile(r"/oauth/v1/token$"), self.hubspot_token),
+            ("GET", re.compile(r"/v1/organizations/(\d+)$"), self.pipedrive_organization),
+            ("GET", re.compile(r"/v1/users/me$"), self.pipedrive_user),
+            ("GET", re.compile(r"/v1/leads$"), self.pipedrive_leads),
+            ("GET", re.compile(r"/api/v2/organizations$"), self.pipedrive_organizations),
+            ("GET", re.compile(r"/v4/spreadsheets/[^/]+/values/(.+)$"), self.sheet_values),
+            ("GET", re.compile(r"/drive/v3/files/[^/]+$"), self.drive_file),
+        ]
+
+    def company(self, object_id) -> str:
+        return self.companies[int(object_id) % len(self.companies)]
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def sleep(self, latency_ms: float) -> None:
+        if latency_ms > 0:
+            time.sleep(latency_ms * random.uniform(0.5, 1.5) / 1000)
+
+    def handle(self, method: str, path: str, query: Dict, body: Optional[Dict],
+               headers) -> Tuple[int, Dict[str, str], bytes]:
+        if path == "/__stats":
+            with self.lock:
+                return 200, {}, json.dumps({"requests": dict(self.counts), "tokens_issued": self.tokens_issued}).encode()
+        for route_method, pattern, handler in self.routes:
+            match = pattern.search(path)
+            if route_method == method and match:
+                self.count(handler.__name__)
+                if random.random() < self.settings["rate_limit_rate"]:
+                    self.count("429")
+                    return 429, {"Retry-After": "1"}, b'{"status": "error", "category": "RATE_LIMITS"}'
+                if handler not in (self.sheet_values, self.drive_file, self.hubspot_token) \
+                        and random.random() < self.settings["unauthorized_rate"]:
+                    self.count("401")
+                    return 401, {}, b'{"status": "error", "category": "EXPIRED_AUTHENTICATION"}'
+                self.sleep(self.settings["sheet_latency_ms"] if handler == self.sheet_values
+                           else self.settings["latency_ms"])
+                response = handler(*match.groups(), query=query, body=body)
+                return 200, {}, response if isinstance(response, bytes) else json.dumps(response).encode()
+        self.count("404")
+        return 404, {}, b'{"error": "not found"}'
+
+    def hubspot_associations(self, query, body):
+        return {"status": "COMPLETE", "results": [
+            {"from": {"id": item["id"]}, "to": [{"toObjectId": int(item["id"]), "associationTypes": []}]}
+            for item in body["inputs"]
+        ]}
+
+    def hubspot_companies(self, query, body):
+        return {"status": "COMPLETE", "results": [
+            {"id": item["id"], "properties": {"name": self.company(item["id"]), "domain": f"c{item['id']}.example"}}
+            for item in body["inputs"]
+        ]}
+
+    def hubspot_contact_companies(self, contact_id, query, body):
+        return {"results": [{"id": contact_id, "type": "contact_to_company"}]}
+
+    def hubspot_company(self, company_id, query, body):
+        return {"id": company_id, "properties": {"name": self.company(company_id), "domain": f"c{company_id}.example"}}
+
+    def hubspot_contacts(self, query, body):
+        after = int(query.get("after", ["0"])[0])
+        limit = int(query.get("limit", ["100"])[0])
+        total = self.settings["crm_companies"]
+        results = [{"id": str(contact_id), "associations": {"companies": {"results": [{"id": str(contact_id)}]}}}
+                   for contact_id in range(after, min(after + limit, total))]
+        response = {"results": results}
+        if after + limit < total:
+            response["paging"] = {"next": {"after": str(after + limit)}}
+        return response
+
+    def hubspot_token(self, query, body):
+        with self.lock:
+            self.tokens_issued += 1
+            token = f"benchmark-{self.tokens_issued}"
+        return {"access_token": token, "refresh_token": "benchmark", "expires_in": 1800}
+
+    def pipedrive_organization(self, organization_id, query, body):
+        return {"success": True, "data": {"id": int(organization_id), "name": self.company(organization_id),
+                                          "website": f"https://o{organization_id}.example"}}
+
+    def pipedrive_user(self, query, body):
+        return {"success": True, "data": {"id": 1}}
+
+    def pipedrive_leads(self, query, body):
+        # One lead per CRM company, each with its own organization
+        start = int(query.get("start", ["0"])[0])
+        limit = int(query.get("limit", ["100"])[0])
+        total = self.settings["crm_companies"]
+        leads = [{"id": f"lead-{index}", "organization_id": index + 1} for index in range(start, min(start + limit, total))]
+        more = start + limit < total
+        return {"success": True, "data": leads, "additional_data": {"pagination": {
+            "start": start, "limit": limit, "more_items_in_collection": more,
+            "next_start": start + limit if more else None}}}
+
+    def pipedrive_organizations(self, query, body):
+        ids = [int(organization_id) for organization_id in query.get("ids", [""])[0].split(",") if organization_id]
+        return {"success": True, "data": [
+            {"id": organization_id, "name": self.company(organization_id),
+             "website": f"https://o{organization_id}.example"}
+            for organization_id in ids
+        ], "additional_data": {"next_cursor": None}}
+
+    def sheet_values(self, cell_range, query, body):
+        """
+        The cells of the requested A1 range; a bare sheet name reads the whole sheet. Like the
+        real API, trailing empty rows are left out.
+        """
+        _, separator, a1_range = unquote(cell_range).rpartition("!")
+        match = A1_RANGE_RE.match(a1_range) if separator else None
+        if match is None:
+            return self.sheet_body
+        first_column, first_row, last_column, last_row = match.groups()
+        if last_column is None:
+            last_column, last_row = first_column, first_row
+        rows = self.sheet_rows[int(first_row or 1) - 1:int(last_row) if last_row else None]
+        first_index = _column_index(first_column) if first_column else 0
+        last_index = _column_index(last_column) + 1 if last_column else None
+        values = [row[first_index:last_index] for row in rows]
+        while values and not values[-1]:
+            values.pop()
+        return {"range": a1_range, "majorDimension": "ROWS", "values": values} if values else {"range": a1_range}
+
+    def drive_file(self, query, body):
+        return {"version": "1", "modifiedTime": "2024-01-01T00:00:00Z"}
+
+
+def _handler_class(upstreams: FakeUpstreams):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _respond(self, method: str) -> None:
+            url = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            try:
+                body = json.loads(raw) if raw and "json" in (self.headers.get("Content-Type") or "") else None
+            except ValueError:
+                body = None
+            status, headers, payload = upstreams.handle(method, url.path, parse_qs(url.query), body, self.headers)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_POST(self):
+            self._respond("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(settings: Dict, ports: Optional[multiprocessing.Queue] = None) -> List[ThreadingHTTPServer]:
+    """
+    Start one server per upstream on free local ports. The servers share the FakeUpstreams state,
+    but each has its own host:port so the app keeps a separate connection pool per upstream.
+    """
+    upstreams = FakeUpstreams(settings)
+    handler = _handler_class(upstreams)
+    servers = []
+    for _ in UPSTREAMS:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    if ports is not None:
+        ports.put({name: server.server_address[1] for name, server in zip(UPSTREAMS, servers)})
+    return servers
+
+
+def _serve_forever(settings: Dict, ports: multiprocessing.Queue) -> None:
+    serve(settings, ports)
+    threading.Event().wait()
+
+
+def start_in_subprocess(settings: Dict) -> Tuple[multiprocessing.Process, Dict[str, str]]:
+    """
+    Run the stand-ins in a separate process, so they do not compete with the app for the GIL.
+    :return: The process and the base URL of each upstream.
+    """
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve_forever, args=(settings, ports), daemon=True)
+    process.start()
+    return process, {name: f"http://127.0.0.1:{port}" for name, port in ports.get(timeout=60).items()}
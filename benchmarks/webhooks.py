@@ -0,0 +1,198 @@
+"""
+Drives concurrent webhook traffic through create_app() against local upstream stand-ins and
+reports latency percentiles and throughput.
+
+    python -m benchmarks.webhooks --target mixed --requests 2000 --concurrency 16
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from urllib.request import urlopen
+
+from benchmarks.upstreams import start_in_subprocess
+
+PIPEDRIVE_CREATOR_ID = 1
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["hubspot", "pipedrive", "mixed"], default="mixed")
+    parser.add_argument("--requests", type=int, default=1000, help="Measured webhook requests.")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests sent first.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients.")
+    parser.add_argument("--events-per-request", type=int, default=1, help="HubSpot events per delivery.")
+    parser.add_argument("--sheet-rows", type=int, default=10000)
+    parser.add_argument("--crm-companies", type=int, default=5000,
+                        help="Distinct HubSpot contacts / Pipedrive organizations the traffic refers to.")
+    parser.add_argument("--match-ratio", type=float, default=0.5, help="Share of CRM companies in the sheet.")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mean upstream API latency.")
+    parser.add_argument("--sheet-latency-ms", type=float, default=200.0, help="Sheet download latency.")
+    parser.add_argument("--unauthorized-rate", type=float, default=0.0, help="Share of upstream calls failing with 401.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of upstream calls failing with 429.")
+    parser.add_argument("--database-uri", default=None, help="Defaults to a fresh SQLite file.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    return parser.parse_args()
+
+
+def configure_environment(args: argparse.Namespace, base_urls: Dict[str, str]) -> None:
+    """
+    Point the app at the stand-ins. Must run before the app package is imported, since
+    configuration and service modules read the environment at import time.
+    """
+    database_uri = args.database_uri or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+    os.environ.update({
+        "HUBSPOT_API_BASE_URL": base_urls["hubspot"],
+        "HUBSPOT_TOKEN_URL": f"{base_urls['hubspot']}/oauth/v1/token",
+        "PIPEDRIVE_API_BASE_URL": base_urls["pipedrive"],
+        "GOOGLE_SHEETS_API_BASE_URL": base_urls["google"],
+        "GOOGLE_DRIVE_API_BASE_URL": base_urls["google"],
+        "GOOGLE_SHEETS_API_KEY": "benchmark",
+        "SPREADSHEET_ID": "benchmark",
+        "SPREADSHEET_SHEET_NAME": "Sheet1",
+        "SQLALCHEMY_DATABASE_URI": database_uri,
+        "WEBHOOK_ASYNC": "False",
+    })
+    os.environ.setdefault("PIPEDRIVE_CONSUMER_KEY", "benchmark")
+    os.environ.setdefault("PIPEDRIVE_CONSUMER_SECRET", "benchmark")
+
+
+def create_benchmark_app():
+    from app import create_app
+    from app.database import db
+    from app.models import AccessToken, UserPipedriveToken
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        AccessToken.delete_all_tokens()
+        AccessToken.save_token("benchmark", time.time() + 86400, refresh_token="benchmark")
+        UserPipedriveToken.save_token("benchmark@example.com", "benchmark", time.time() + 86400,
+                                      creator_id=PIPEDRIVE_CREATOR_ID)
+    return app
+
+
+def build_requests(args: argparse.Namespace, count: int, rng: random.Random) -> List[Tuple[str, object]]:
+    requests = []
+    for _ in range(count):
+        target = args.target if args.target != "mixed" else rng.choice(["hubspot", "pipedrive"])
+        if target == "hubspot":
+            requests.append(("/webhook", [
+                {"eventId": rng.getrandbits(31), "subscriptionType": "contact.creation",
+                 "objectId": rng.randrange(args.crm_companies)}
+                for _ in range(args.events_per_request)
+            ]))
+        else:
+            requests.append(("/pipedrive/webhook/lead", {
+                "meta": {"id": rng.getrandbits(31), "action": "added", "object": "lead"},
+                "data": {"creator_id": PIPEDRIVE_CREATOR_ID, "organization_id": rng.randrange(args.crm_companies)},
+            }))
+    return requests
+
+
+def drive(app, requests: List[Tuple[str, object]], concurrency: int) -> Tuple[List[Tuple[str, float, int]], float]:
+    """
+    Send the requests from `concurrency` threads, each with its own test client.
+    :return: (path, latency in seconds, status code) per request, and the wall-clock duration.
+    """
+    local = threading.local()
+
+    def send(request: Tuple[str, object]) -> Tuple[str, float, int]:
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        path, payload = request
+        started = time.perf_counter()
+        response = local.client.post(path, json=payload)
+        return path, time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, requests))
+    return results, time.perf_counter() - started
+
+
+def summarize(results: List[Tuple[str, float, int]], duration: float) -> Dict:
+    def latency_stats(latencies: List[float]) -> Dict:
+        if len(latencies) < 2:
+            return {"count": len(latencies)}
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        return {
+            "count": len(latencies),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+            "p50_ms": round(percentiles[49] * 1000, 2),
+            "p95_ms": round(percentiles[94] * 1000, 2),
+            "p99_ms": round(percentiles[98] * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2),
+        }
+
+    report = {
+        "requests": len(results),
+        "duration_s": round(duration, 3),
+        "requests_per_second": round(len(results) / duration, 1) if duration else None,
+        "status_codes": dict(Counter(status for _, _, status in results)),
+        "latency": latency_stats([latency for _, latency, _ in results]),
+        "by_endpoint": {},
+    }
+    for path in sorted({path for path, _, _ in results}):
+        report["by_endpoint"][path] = latency_stats([latency for p, latency, _ in results if p == path])
+    return report
+
+
+def print_report(report: Dict) -> None:
+    print(f"{report['requests']} requests in {report['duration_s']}s "
+          f"({report['requests_per_second']} req/s), status codes {report['status_codes']}")
+    rows = [("all", report["latency"])] + list(report["by_endpoint"].items())
+    print(f"{'endpoint':<26}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for name, stats in rows:
+        if "p50_ms" not in stats:
+            continue
+        print(f"{name:<26}{stats['count']:>8}{stats['mean_ms']:>10}{stats['p50_ms']:>10}"
+              f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    print(f"upstream requests: {report['upstream']}")
+
+
+def main() -> None:
+    args = parse_args()
+    process, base_urls = start_in_subprocess({
+        "latency_ms": args.latency_ms,
+        "sheet_latency_ms": args.sheet_latency_ms,
+        "unauthorized_rate": args.unauthorized_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "sheet_rows": args.sheet_rows,
+        "crm_companies": args.crm_companies,
+        "match_ratio": args.match_ratio,
+        "seed": args.seed,
+    })
+    try:
+        configure_environment(args, base_urls)
+        app = create_benchmark_app()
+        logging.getLogger().setLevel(args.log_level)
+        logging.getLogger("app.utils").setLevel(args.log_level)
+
+        rng = random.Random(args.seed)
+        drive(app, build_requests(args, args.warmup, rng), args.concurrency)
+        results, duration = drive(app, build_requests(args, args.requests, rng), args.concurrency)
+
+        report = summarize(results, duration)
+        with urlopen(f"{base_urls['hubspot']}/__stats") as response:
+            report["upstream"] = json.load(response)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_report(report)
+    finally:
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import os
+import shutil
+
+
+def on_starting(server):
+    # Samples of a previous run would otherwise be added to the new counters
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from app.services.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,39 @@
+"""webhook deliveries table
+
+Revision ID: 3f9d2b7c8e15
+Revises: e19b5a3c7d24
+Create Date: 2026-10-17 19:02:41.530118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9d2b7c8e15'
+down_revision = 'e19b5a3c7d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('webhook_deliveries',
+    sa.Column('source', sa.String(length=32), nullable=False),
+    sa.Column('delivery_id', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('webhook_event_id', sa.Integer(), nullable=True),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('status_code', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('source', 'delivery_id')
+    )
+    with op.batch_alter_table('webhook_deliveries', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_webhook_deliveries_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('webhook_deliveries', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_webhook_deliveries_expires_at'))
+
+    op.drop_table('webhook_deliveries')
@@ -0,0 +1,52 @@
+"""sheet rows table
+
+Revision ID: 6a2d8e4f1b07
+Revises: 3f9d2b7c8e15
+Create Date: 2026-10-17 21:14:08.207316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '6a2d8e4f1b07'
+down_revision = '3f9d2b7c8e15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+    if is_postgresql:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_table('sheet_rows',
+    sa.Column('row_number', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('adviser_name', sa.Text(), nullable=True),
+    sa.Column('lead_name', sa.Text(), nullable=True),
+    sa.Column('linkedin_url', sa.Text(), nullable=True),
+    sa.Column('company_name', sa.Text(), nullable=True),
+    sa.Column('lead_title', sa.Text(), nullable=True),
+    sa.Column('company_key', sa.String(length=255), nullable=True),
+    sa.Column('name_tokens', postgresql.ARRAY(sa.Text()) if is_postgresql else sa.JSON(), nullable=False),
+    sa.Column('content_hash', sa.String(length=40), nullable=False),
+    sa.PrimaryKeyConstraint('row_number')
+    )
+    with op.batch_alter_table('sheet_rows', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sheet_rows_company_key'), ['company_key'], unique=False)
+        if is_postgresql:
+            batch_op.create_index('ix_sheet_rows_name_tokens', ['name_tokens'], unique=False, postgresql_using='gin')
+            batch_op.create_index('ix_sheet_rows_company_key_trgm', ['company_key'], unique=False,
+                                  postgresql_using='gin', postgresql_ops={'company_key': 'gin_trgm_ops'})
+
+
+def downgrade():
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+    with op.batch_alter_table('sheet_rows', schema=None) as batch_op:
+        if is_postgresql:
+            batch_op.drop_index('ix_sheet_rows_company_key_trgm')
+            batch_op.drop_index('ix_sheet_rows_name_tokens')
+        batch_op.drop_index(batch_op.f('ix_sheet_rows_company_key'))
+
+    op.drop_table('sheet_rows')
@@ -0,0 +1,26 @@
+"""hubspot refresh token added
+
+Revision ID: 8b1f0c7e2a93
+Revises: 5d2e8f41c9ab
+Create Date: 2026-10-17 10:03:18.226417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1f0c7e2a93'
+down_revision = '5d2e8f41c9ab'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('access_tokens', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('refresh_token', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('access_tokens', schema=None) as batch_op:
+        batch_op.drop_column('refresh_token')
@@ -0,0 +1,78 @@
+"""lead company key added
+
+Revision ID: c4a7e9d13f60
+Revises: 8b1f0c7e2a93
+Create Date: 2026-10-17 10:41:55.870134
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7e9d13f60'
+down_revision = '8b1f0c7e2a93'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of app.utils.normalize_name as of this revision, so later changes to the
+# normalizer cannot change what this migration writes
+COMPANY_NAME_SUFFIXES = frozenset({
+    'the', 'llc', 'ltd', 'inc', 'corp', 'company', 'co', 'plc', 'group', 'enterprises', 'services', 'associates',
+    'international', 'solutions', 'consulting', 'industries', 'partners', 'studios', 'technologies', 'manufacturers',
+})
+COMPANY_NAME_SUFFIX_PAIRS = frozenset({('pvt', 'ltd'), ('private', 'limited')})
+WORD_SPLIT_RE = re.compile(r'(\w+)')
+# Leads updated per executemany batch
+BACKFILL_BATCH_SIZE = 1000
+
+
+def company_key(company_name):
+    pieces = WORD_SPLIT_RE.split((company_name or '').lower())
+    kept = []
+    i = 1
+    while i < len(pieces):
+        word = pieces[i]
+        if i + 2 < len(pieces) and pieces[i + 1] == ' ' and (word, pieces[i + 2]) in COMPANY_NAME_SUFFIX_PAIRS:
+            kept.append(pieces[i - 1])
+            i += 4
+            continue
+        kept.append(pieces[i - 1])
+        if word not in COMPANY_NAME_SUFFIXES:
+            kept.append(word)
+        i += 2
+    kept.append(pieces[i - 1])
+    return ' '.join(''.join(kept).split()) or None
+
+
+def upgrade():
+    with op.batch_alter_table('leads', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('company_key', sa.String(length=255), nullable=True))
+
+    # Backfill: the oldest lead of every company keeps the key, later duplicates stay NULL
+    connection = op.get_bind()
+    leads = sa.table('leads', sa.column('id', sa.Integer), sa.column('company_name', sa.String),
+                     sa.column('company_key', sa.String))
+    update = leads.update().where(leads.c.id == sa.bindparam('lead_id')).values(company_key=sa.bindparam('key'))
+    seen_keys = set()
+    updates = []
+    for lead_id, company_name in connection.execute(
+            sa.select(leads.c.id, leads.c.company_name).order_by(leads.c.id)).fetchall():
+        key = company_key(company_name)
+        if not key or key in seen_keys:
+            continue
+        seen_keys.add(key)
+        updates.append({"lead_id": lead_id, "key": key})
+    for offset in range(0, len(updates), BACKFILL_BATCH_SIZE):
+        connection.execute(update, updates[offset:offset + BACKFILL_BATCH_SIZE])
+
+    with op.batch_alter_table('leads', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_leads_company_key'), ['company_key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('leads', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_leads_company_key'))
+        batch_op.drop_column('company_key')
@@ -0,0 +1,33 @@
+"""sheet rows company key text
+
+Revision ID: d5f2a8c41e93
+Revises: 6a2d8e4f1b07
+Create Date: 2026-10-17 23:02:41.519804
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f2a8c41e93'
+down_revision = '6a2d8e4f1b07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sheet_rows', schema=None) as batch_op:
+        batch_op.alter_column('company_key',
+               existing_type=sa.String(length=255),
+               type_=sa.Text(),
+               existing_nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('sheet_rows', schema=None) as batch_op:
+        batch_op.alter_column('company_key',
+               existing_type=sa.Text(),
+               type_=sa.String(length=255),
+               existing_nullable=True,
+               postgresql_using='left(company_key, 255)')
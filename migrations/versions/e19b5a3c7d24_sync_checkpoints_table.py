@@ -0,0 +1,29 @@
+"""sync checkpoints table
+
+Revision ID: e19b5a3c7d24
+Revises: c4a7e9d13f60
+Create Date: 2026-10-17 11:20:07.114592
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e19b5a3c7d24'
+down_revision = 'c4a7e9d13f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sync_checkpoints',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('cursor', sa.Text(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('sync_checkpoints')
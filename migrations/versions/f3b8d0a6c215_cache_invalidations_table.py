@@ -0,0 +1,36 @@
+"""cache invalidations table
+
+Revision ID: f3b8d0a6c215
+Revises: d5f2a8c41e93
+Create Date: 2026-10-17 19:42:18.306517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d0a6c215'
+down_revision = 'd5f2a8c41e93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_invalidations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cache', sa.String(length=32), nullable=False),
+    sa.Column('object_id', sa.String(length=64), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    with op.batch_alter_table('cache_invalidations', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_cache_invalidations_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('cache_invalidations', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_cache_invalidations_created_at'))
+
+    op.drop_table('cache_invalidations')
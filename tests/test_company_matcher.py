@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from app.services.company_matcher import FuzzyCompanyMatcher, company_name_features
+
+
+def sheet_rows(*company_names):
+    return [['Adviser', 'Lead', 'https://linkedin.com/in/lead', name, 'CEO'] for name in company_names]
+
+
+def test_features_ignore_case_and_company_suffixes():
+    assert company_name_features('Acme Inc') == company_name_features('ACME')
+    assert company_name_features('Acme Pvt Ltd') == company_name_features('acme')
+    assert company_name_features('Acme') != company_name_features('Acme Holdings')
+
+
+def test_features_are_sorted_unique_and_stable():
+    features = company_name_features('Acme Acme Rockets')
+    assert features == sorted(set(features))
+    # crc32 hashes do not depend on the process hash seed
+    assert features == company_name_features('acme acme rockets')
+
+
+def test_features_of_empty_names():
+    assert company_name_features('') == []
+    assert company_name_features('Inc') == []
+
+
+def test_exact_name_scores_one():
+    matcher = FuzzyCompanyMatcher.from_rows(sheet_rows('Acme Rockets', 'Globex', 'Initech'))
+    scores = matcher.score('Globex')
+    assert scores[1] == pytest.approx(1.0)
+    assert scores[0] == 0.0 and scores[2] == 0.0
+
+
+def test_score_without_features():
+    matcher = FuzzyCompanyMatcher.from_rows(sheet_rows('Acme Rockets'))
+    assert matcher.score('') is None
+    assert matcher.score('The Company') is None
+    assert matcher.best_match('', 0.0) == (None, 0.0)
+
+
+def test_empty_sheet():
+    matcher = FuzzyCompanyMatcher.from_rows([])
+    assert len(matcher.score('Acme')) == 0
+    assert matcher.best_match('Acme', 0.0) == (None, 0.0)
+
+
+def test_rows_without_company_name_never_match():
+    matcher = FuzzyCompanyMatcher.from_rows([['Adviser', 'Lead'], ['Adviser', 'Lead', '', '', 'CEO']]
+                                            + sheet_rows('Acme'))
+    scores = matcher.score('Acme')
+    assert list(scores[:2]) == [0.0, 0.0]
+    assert matcher.best_match('Acme', 0.5) == (2, pytest.approx(1.0))
+
+
+def test_closest_name_ranks_first():
+    matcher = FuzzyCompanyMatcher.from_rows(sheet_rows('Acme Corporation', 'Acme Holdings', 'Globex'))
+    row_id, score = matcher.best_match('Acme Holdings Inc', 0.5)
+    assert row_id == 1
+    assert score == pytest.approx(1.0)
+
+    scores = matcher.score('Acme Holdngs')
+    assert np.argsort(-scores).tolist() == [1, 0, 2]
+
+
+def test_rare_tokens_outweigh_common_tokens():
+    matcher = FuzzyCompanyMatcher.from_rows(
+        sheet_rows('Global Freight', 'Global Foods', 'Global Zephyr', 'Global Mining'))
+    assert matcher.best_match('Zephyr Global', 0.3)[0] == 2
+
+
+def test_misspelled_name_matches_through_trigrams():
+    matcher = FuzzyCompanyMatcher.from_rows(sheet_rows('Initech', 'Umbrella'))
+    row_id, score = matcher.best_match('Inittech', 0.5)
+    assert row_id == 0
+    assert 0.5 <= score < 1.0
+
+
+def test_threshold():
+    matcher = FuzzyCompanyMatcher.from_rows(sheet_rows('Acme Rockets', 'Globex'))
+    score = float(matcher.score('Acme')[0])
+    assert 0.0 < score < 1.0
+    assert matcher.best_match('Acme', score) == (0, pytest.approx(score))
+    assert matcher.best_match('Acme', score + 0.01) == (None, pytest.approx(score))
+    assert matcher.best_match('Umbrella', 0.0) == (0, 0.0)
+    assert matcher.best_match('Umbrella', 0.01) == (None, 0.0)
+
+
+def test_ties_go_to_the_earliest_row():
+    matcher = FuzzyCompanyMatcher.from_rows(sheet_rows('Globex', 'Acme', 'Acme Inc'))
+    assert matcher.best_match('Acme', 0.5) == (1, pytest.approx(1.0))
+
+
+def test_matcher_from_arrays_scores_like_the_original():
+    matcher = FuzzyCompanyMatcher.from_rows(sheet_rows('Acme Rockets', 'Globex', 'Initech'))
+    copy = FuzzyCompanyMatcher(*(np.array(getattr(matcher, name)) for name in
+                                 ('features', 'offsets', 'postings', 'idf', 'row_norms')))
+    np.testing.assert_array_equal(copy.score('Acme Globex'), matcher.score('Acme Globex'))
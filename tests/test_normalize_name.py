@@ -0,0 +1,97 @@
+import random
+import re
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.utils import normalize_name, record_normalize_cache_metrics
+
+
+def regex_normalize_name(name: str) -> str:
+    """
+    The regex implementation normalize_name replaced, kept to check the output did not change.
+    """
+    name = name.lower()
+    suffixes = r'\b(the|pvt ltd|private limited|llc|ltd|inc|corp|company|co|plc|group|enterprises|services|associates|international|solutions|consulting|industries|partners|studios|technologies|manufacturers)\b'
+    name = re.sub(suffixes, '', name)
+    name = re.sub(r'\s+', ' ', name).strip()
+    return name
+
+
+FUZZ_WORDS = ['acme', 'the', 'pvt', 'ltd', 'private', 'limited', 'llc', 'inc', 'corp', 'co', 'company', 'plc',
+              'group', 'services', 'Technologies', 'INC', 'Pvt', 'theatre', 'cobalt', 'incorporated', 'café',
+              'co_op', '3m', 'élan', 'ltd2']
+FUZZ_SEPARATORS = [' ', '  ', '\t', '\n', ' \r\n ', ' ', ' ', '.', ',', '-', '&', "'", '. ', ', ',
+                   ' - ', '(', ')', '/', '']
+
+
+@pytest.mark.parametrize('name', [
+    '',
+    '   ',
+    'Acme',
+    'Acme Pvt Ltd',
+    'Acme Pvt. Ltd.',
+    'Acme pvt  ltd',
+    'Acme Pvt\tLtd',
+    'Acme Private Limited',
+    'Acme Private\nLimited',
+    'Pvt Ltd',
+    'pvt ltd pvt ltd',
+    'Acme pvt ltdx',
+    'The Acme, Inc.',
+    'Acme Co-op',
+    'Acme & Co.',
+    'Acme (Pvt) Ltd',
+    '  ACME   Corp.  ',
+    'Acme\t\tRockets\n',
+    'Acme Inc',
+    'Acme Rockets　LLC',
+    'Theatre Company',
+    'Inc Inc Inc',
+    'Acme_Inc',
+    'Café Inc',
+    'Acme Technologies Group International',
+])
+def test_matches_regex_implementation(name):
+    assert normalize_name(name) == regex_normalize_name(name)
+    assert normalize_name.__wrapped__(name) == regex_normalize_name(name)
+
+
+def test_matches_regex_implementation_on_random_names():
+    generator = random.Random(20240601)
+    for _ in range(5000):
+        pieces = [generator.choice(FUZZ_SEPARATORS)]
+        for _ in range(generator.randint(0, 6)):
+            pieces += [generator.choice(FUZZ_WORDS), generator.choice(FUZZ_SEPARATORS)]
+        name = ''.join(pieces)
+        assert normalize_name.__wrapped__(name) == regex_normalize_name(name), repr(name)
+
+
+def test_results_are_memoized():
+    normalize_name.cache_clear()
+    normalize_name('Acme Inc')
+    normalize_name('Acme Inc')
+    info = normalize_name.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+
+def normalize_lookups(result):
+    return REGISTRY.get_sample_value('cache_lookups_total', {'cache': 'normalize_name', 'result': result}) or 0.0
+
+
+def test_cache_counters_are_exported_once():
+    normalize_name.cache_clear()
+    record_normalize_cache_metrics()
+    hits, misses = normalize_lookups('hit'), normalize_lookups('miss')
+    normalize_name('Globex Corp')
+    normalize_name('Globex Corp')
+    record_normalize_cache_metrics()
+    record_normalize_cache_metrics()
+    assert (normalize_lookups('hit') - hits, normalize_lookups('miss') - misses) == (1, 1)
+    assert REGISTRY.get_sample_value('cache_entries', {'cache': 'normalize_name'}) == 1
+
+    # Counting starts over after a cache_clear
+    normalize_name.cache_clear()
+    normalize_name('Initech')
+    record_normalize_cache_metrics()
+    assert (normalize_lookups('hit') - hits, normalize_lookups('miss') - misses) == (1, 2)